@@ -4,19 +4,131 @@ TheNexusAvenger
 Runs the install.
 """
 
+import argparse
+import atexit
+import sys
+from helper.Bundle import exportBundle, getBundleSystemFiles, importBundle
+from helper.Cache import prefetchFiles
 from helper.Path import pathFileExists
 from helper.InstallContext import InstallContext
+from helper.Journal import getSystemJournal
+from helper.Mirror import disableMirror, seedPackageCaches
+from helper.MirrorServer import DEFAULT_MIRROR_BIND_ADDRESS, serveMirror
+from helper.Scheduler import ScheduledTask, runTasks
+from helper.Trace import enableTracing, traceSpan, writeTrace
 from software.Applications import presets
-from software.ArchSetup import setUpArch
+from software.ArchSetup import planArchSetup, setUpArch
+from software.Catalog import loadCatalog, selectEntries
+from software.InstallPlan import InstallPlan
+from software.ManagedSoftware import downloadSoftwarePackages, prefetchSoftware
+from software.PackageManager import warmSystemPackageManagers
+from software.UserSoftware import getUserDownloadUrls
 
 
+# Parse the arguments.
+argumentParser = argparse.ArgumentParser(description="Installs the system software.")
+argumentParser.add_argument("--jobs", type=int, default=1, help="Maximum number of presets to install at once. The default of 1 installs them one at a time in a reproducible order.")
+argumentParser.add_argument("--trace", metavar="DIRECTORY", help="Directory to write a Chrome trace and a summary of the slowest steps to.")
+argumentParser.add_argument("--plan", action="store_true", help="Prints the changes the install would make without making them. Exits with 0 if there are no changes and 2 otherwise.")
+argumentParser.add_argument("--ignore-journal", action="store_true", help="Installs all presets, including presets that were completed and have not changed since.")
+argumentParser.add_argument("--catalog", action="append", default=[], metavar="PATH", help="JSON catalog of additional presets to load. Can be specified multiple times.")
+argumentParser.add_argument("--only", action="append", metavar="PRESETS", help="Comma-separated names of the presets to install. Their dependencies are also installed.")
+argumentParser.add_argument("--skip", action="append", metavar="PRESETS", help="Comma-separated names of the presets to not install.")
+argumentParser.add_argument("--serve", type=int, metavar="PORT", help="Downloads the files and packages of the presets and serves them as a mirror for the installs of other machines.")
+argumentParser.add_argument("--bind", default=DEFAULT_MIRROR_BIND_ADDRESS, metavar="ADDRESS", help="Address to serve the mirror on with --serve. Defaults to " + DEFAULT_MIRROR_BIND_ADDRESS + ", which only allows this machine to use it. Use the address of the network to share it with.")
+argumentParser.add_argument("--export-bundle", metavar="PATH", help="Downloads the files and packages of the presets and writes them to a bundle for installing without a network.")
+argumentParser.add_argument("--bundle", metavar="PATH", help="Installs from a bundle written with --export-bundle without using the network.")
+arguments = argumentParser.parse_args()
+if arguments.trace is not None:
+    # The trace is written on exit so that it is kept when the install fails.
+    enableTracing()
+    atexit.register(writeTrace, arguments.trace, "RunInstall")
+
+# Import the bundle before reading the package databases so that the package indexes of the bundle are used.
+if arguments.bundle is not None:
+    importBundle(arguments.bundle)
+
+# Start reading the package databases in the background.
+warmSystemPackageManagers()
+
+# Load the additional catalogs and select the presets to install.
+for catalogPath in arguments.catalog:
+    try:
+        catalogEntries = loadCatalog(catalogPath, not arguments.plan)
+    except (OSError, ValueError, KeyError) as error:
+        argumentParser.error("Unable to load catalog " + catalogPath + ": " + str(error))
+    presetNames = set(preset.name for preset in presets)
+    for entry in catalogEntries:
+        if entry.name in presetNames:
+            argumentParser.error("Preset " + entry.name + " of catalog " + catalogPath + " is already defined.")
+    presets = presets + [entry.toManagedSoftware() for entry in catalogEntries]
+onlyPresets = None if arguments.only is None else [name for names in arguments.only for name in names.split(",") if name != ""]
+skipPresets = [] if arguments.skip is None else [name for names in arguments.skip for name in names.split(",") if name != ""]
+try:
+    presets = selectEntries(presets, onlyPresets, skipPresets)
+except ValueError as error:
+    argumentParser.error(str(error))
+selectedPresetNames = set(preset.name for preset in presets)
+
+# Download everything the presets and the user setup use and serve it to other machines or write it to a bundle if requested.
+# The packages are downloaded even if they are installed so that machines without them can use them.
+if arguments.serve is not None or arguments.export_bundle is not None:
+    if arguments.serve is not None:
+        disableMirror()
+    with traceSpan("prefetch", "http"):
+        downloadedUrls = prefetchSoftware(presets, True) + getUserDownloadUrls()
+        prefetchFiles(getUserDownloadUrls())
+    packageFiles = downloadSoftwarePackages(presets)
+    if arguments.export_bundle is not None:
+        exportBundle(arguments.export_bundle, downloadedUrls, packageFiles, getBundleSystemFiles([ppaRepository for preset in presets for ppaRepository in preset.ppaRepositories]))
+    else:
+        serveMirror(arguments.serve, downloadedUrls, packageFiles, arguments.bind)
+    sys.exit(0)
+
+# Print the plan instead of installing if requested.
+if arguments.plan:
+    plan = InstallPlan()
+    planContext = InstallContext()
+    if pathFileExists("pacman"):
+        planArchSetup(plan)
+    for preset in presets:
+        preset.plan(plan, planContext)
+    planContext.plan(plan)
+    plan.print()
+    sys.exit(0 if plan.isConverged() else 2)
+
 # Set up the specifics for the operating system.
 if pathFileExists("pacman"):
-    setUpArch()
+    with traceSpan("setUpArch", "install"):
+        setUpArch()
+
+# Determine the presets that changed since they were last completed.
+# Presets that are no longer installed, such as from a package or file being removed, are installed again.
+journal = getSystemJournal()
+changedPresets = []
+for preset in presets:
+    if arguments.ignore_journal or not journal.isStepCompleted(preset.name, preset.getJournalInputs()) or not preset.isInstalled():
+        changedPresets.append(preset)
+if len(changedPresets) < len(presets):
+    print("Skipping " + str(len(presets) - len(changedPresets)) + " presets that are unchanged since they were completed.")
+
+# Download the files for all the presets before installing.
+with traceSpan("prefetch", "http"):
+    prefetchSoftware(changedPresets)
 
 # Run the install.
+# Unchanged presets are still scheduled as empty tasks so that presets can depend on them.
+# Each preset is recorded in the journal once it is complete so that a failed run resumes after it.
 context = InstallContext()
-for installFunction in presets:
-    installFunction(context)
+tasks = []
+for preset in presets:
+    selectedDependencies = [name for name in preset.dependencies if name in selectedPresetNames]
+    if preset in changedPresets:
+        tasks.append(ScheduledTask(preset.name, lambda preset=preset: preset.installAndRecord(context, journal), selectedDependencies))
+    else:
+        tasks.append(ScheduledTask(preset.name, lambda: None, selectedDependencies))
+runTasks(tasks, arguments.jobs)
+with traceSpan("seedPackageCaches", "http"):
+    seedPackageCaches(context.getQueuedPackageNames())
 context.updatePackages()
-context.installQueuedPackages()
\ No newline at end of file
+context.installQueuedPackages()
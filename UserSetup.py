@@ -4,17 +4,36 @@ TheNexusAvenger
 Sets up the user profile.
 """
 
+import argparse
+import atexit
 import os
 import shutil
 import subprocess
 import sys
-import tarfile
 import tempfile
-from helper.Http import httpGet
+from helper.Archive import extractTarArchive
+from helper.Bundle import importBundle
+from helper.Journal import getFileFingerprint, getUserJournal
 from helper.Path import pathFileExists
 from helper.Process import runProcess
+from helper.Trace import enableTracing, writeTrace
+from software.UserSoftware import JETBRAINS_TOOLBOX_URL, vscodeExtensions
 
 
+# Parse the arguments.
+argumentParser = argparse.ArgumentParser(description="Sets up the user profile.")
+argumentParser.add_argument("--trace", metavar="DIRECTORY", help="Directory to write a Chrome trace and a summary of the slowest steps to.")
+argumentParser.add_argument("--bundle", metavar="PATH", help="Sets up the user profile from a bundle written with RunInstall.py --export-bundle without using the network.")
+arguments = argumentParser.parse_args()
+if arguments.trace is not None:
+    # The trace is written on exit so that it is kept when the setup fails.
+    enableTracing()
+    atexit.register(writeTrace, arguments.trace, "UserSetup")
+
+# Import the downloads of the bundle. The packages and system files are imported by RunInstall.py.
+if arguments.bundle is not None:
+    importBundle(arguments.bundle, False)
+
 # Create the Nexus LU Launcher icon.
 localApplicationsDirectory = os.path.expanduser("~/.local/share/applications/")
 nlulShortcutLocation = localApplicationsDirectory + "/nexus-lu-launcher.desktop"
@@ -32,29 +51,19 @@ if not os.path.exists(nlulShortcutLocation):
         file.write("Categories=Game;")
 
 # Install VS Code extensions.
-installedVSCodeExtensions = subprocess.check_output(["code", "--list-extensions"]).decode().split("\n")
-for extension in ["evaera.vscode-rojo", "Nightrains.robloxlsp", "yzhang.markdown-all-in-one"]:
-    if extension not in installedVSCodeExtensions:
-        runProcess(["code", "--install-extension", extension])
+vscodeExtensions.install()
 
 # Download and run Jetbrains Toolbox.
 jetbrainsToolboxInstallLocation = os.path.expanduser("~/.local/share/JetBrains/Toolbox")
 if not os.path.exists(jetbrainsToolboxInstallLocation):
-    # Download Jetbrains Toolbox.
-    print("Downloading Jetbrains Toolbox.")
-    jetbrainsToolboxDownloadLocation = tempfile.NamedTemporaryFile(suffix=".tar.gz").name
-    with open(jetbrainsToolboxDownloadLocation, "wb") as file:
-        file.write(httpGet("https://download.jetbrains.com/toolbox/jetbrains-toolbox-1.25.12627.tar.gz"))
-
-    # Extract Jetbrains Toolbox.
-    print("Extracting Jetbrains Toolbox.")
-    jetbrainsToolboxExtractLocation = tempfile.NamedTemporaryFile().name
-    file = tarfile.open(jetbrainsToolboxDownloadLocation)
-    file.extractall(jetbrainsToolboxExtractLocation)
-
-    # Run Jetbrains Toolbox.
-    print("Running Jetbrains Toolbox.")
-    runProcess([jetbrainsToolboxExtractLocation + "/" + os.listdir(jetbrainsToolboxExtractLocation)[0] + "/jetbrains-toolbox"])
+    with tempfile.TemporaryDirectory() as jetbrainsToolboxExtractLocation:
+        # Download and extract Jetbrains Toolbox.
+        print("Downloading and extracting Jetbrains Toolbox.")
+        extractTarArchive(JETBRAINS_TOOLBOX_URL, jetbrainsToolboxExtractLocation)
+
+        # Run Jetbrains Toolbox.
+        print("Running Jetbrains Toolbox.")
+        runProcess([jetbrainsToolboxExtractLocation + "/" + os.listdir(jetbrainsToolboxExtractLocation)[0] + "/jetbrains-toolbox"])
 
 # Create the desktop icon for Jetbrains Toolbox.
 jetbrainsToolboxShortcutLocation = localApplicationsDirectory + "jetbrains-toolbox.desktop"
@@ -75,15 +84,23 @@ if not pathFileExists("rojo"):
     runProcess(["cargo", "install", "rojo"])
 
 # Set git to use vim.
-runProcess(["git", "config", "--global", "core.editor", "vim"])
+# Steps that are not needed again unless their inputs change are recorded in the journal.
+journal = getUserJournal()
+gitConfigPath = os.path.expanduser("~/.gitconfig")
+if not journal.isStepCompleted("gitEditor", {"editor": "vim", "gitConfig": getFileFingerprint(gitConfigPath)}):
+    runProcess(["git", "config", "--global", "core.editor", "vim"])
+    journal.completeStep("gitEditor", {"editor": "vim", "gitConfig": getFileFingerprint(gitConfigPath)})
 
 # Add to the user environment.
 for environmentFile in ["~/.bashrc", "~/.zshrc"]:
     environmentFile = os.path.expanduser(environmentFile)
+    additionalPaths = ["$HOME/.cargo/bin/"]
+    if journal.isStepCompleted("environment " + environmentFile, {"paths": additionalPaths, "file": getFileFingerprint(environmentFile)}):
+        continue
     with open(environmentFile) as readFile:
         environmentFileContents = readFile.read()
         changesMade = False
-        for additionalPath in ["$HOME/.cargo/bin/"]:
+        for additionalPath in additionalPaths:
             additionalLine = "export PATH=\"$PATH:" + additionalPath + "\""
             if additionalLine not in environmentFileContents:
                 environmentFileContents += "\n" + additionalLine
@@ -91,6 +108,7 @@ for environmentFile in ["~/.bashrc", "~/.zshrc"]:
         if changesMade:
             with open(environmentFile, "w") as writeFile:
                 writeFile.write(environmentFileContents)
+    journal.completeStep("environment " + environmentFile, {"paths": additionalPaths, "file": getFileFingerprint(environmentFile)})
 
 # Set the desktop background.
 # From: https://superuser.com/questions/488232/how-to-set-kde-desktop-wallpaper-from-command-line
@@ -0,0 +1,553 @@
+"""
+TheNexusAvenger
+
+Benchmarks the install of RunInstall.py without changing the system.
+Package managers and processes are replaced with fakes that wait for a configurable
+latency, the package databases are generated fixtures, and downloads are served by
+a local HTTP server through the mirror support. Results are written as JSON.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import http.server
+import io
+import json
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from types import ModuleType
+from typing import Any, Dict, List, Tuple
+
+# Set up the environment before the modules read it.
+repositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repositoryDirectory)
+benchmarkDirectory = tempfile.mkdtemp(prefix="nexus-setup-benchmark-")
+os.environ["NEXUS_SETUP_CACHE_DIRECTORY"] = os.path.join(benchmarkDirectory, "cache")
+os.environ["NEXUS_SETUP_STATE_DIRECTORY"] = os.path.join(benchmarkDirectory, "state")
+os.environ["NEXUS_SETUP_LOG_DIRECTORY"] = os.path.join(benchmarkDirectory, "logs")
+
+import helper.Cache
+import helper.Journal
+import helper.Mirror
+import helper.Path
+import helper.Process
+import helper.Ubuntu
+import software.Applications
+import software.ArchSetup
+import software.ManagedSoftware
+import software.PackageManager
+from helper.Dpkg import DpkgPackage, getDpkgArchitectures, readDpkgStatus
+from helper.PackageName import normalizePackageName
+from helper.Pacman import PacmanDatabase, PacmanPackage
+from helper.Process import ProcessResult
+from helper.Trace import enableTracing, getTracer
+from helper.Ubuntu import AptSourceIndex
+from software.PackageManager import AptPackageManager, PacmanPackageManager
+
+processModules = []
+patchedGlobals: Dict[Tuple[ModuleType, str], Any] = {}
+
+
+class BenchmarkLatency:
+    def __init__(self, processLatency: float, packageLatency: float):
+        """Creates the latency of the fake processes and package managers.
+
+        :param processLatency: Time in seconds each process and package transaction takes.
+        :param packageLatency: Additional time in seconds each package in a transaction takes.
+        """
+
+        self.processLatency = processLatency
+        self.packageLatency = packageLatency
+        self.lock = threading.Lock()
+        self.processes = []
+        self.installedPackageCount = 0
+        self.rootPath = None
+        self.binDirectory = None
+
+
+    def runProcess(self, parameters: List[str], workingDirectory: str = None, timeout: float = None) -> ProcessResult:
+        """Records a process and waits for the process latency instead of running it.
+
+        :param parameters: Parameters of the process.
+        :param workingDirectory: Working directory of the process.
+        :param timeout: Timeout of the process.
+        :return: The successful result of the process.
+        """
+
+        startTime = time.time()
+        time.sleep(self.processLatency)
+        with self.lock:
+            self.processes.append(parameters)
+            self.applyProcess(parameters)
+        return ProcessResult(parameters, 0, startTime, self.processLatency, None)
+
+
+    def applyProcess(self, parameters: List[str]) -> None:
+        """Writes the changes of a process that the install checks for to the fixture
+        so that a second install sees them.
+
+        :param parameters: Parameters of the process.
+        """
+
+        if self.rootPath is None:
+            return
+        if parameters[0] == "add-apt-repository":
+            # Write the source file of the PPA repository.
+            owner, name = parameters[-1][len("ppa:"):].split("/", 1)
+            with open(os.path.join(self.rootPath, "etc/apt/sources.list.d", owner + "-ubuntu-" + name + "-jammy.list"), "w") as file:
+                file.write("deb https://ppa.launchpadcontent.net/" + owner + "/" + name + "/ubuntu/ jammy main\n")
+        elif parameters[0:2] == ["dpkg", "--add-architecture"]:
+            # Add the foreign architecture.
+            with open(os.path.join(self.rootPath, "var/lib/dpkg/arch"), "a") as file:
+                file.write(parameters[2] + "\n")
+        elif parameters[0] == "sh":
+            # Create the cargo command installed by rustup, which is the only script run with sh.
+            createFakeCommand(self.binDirectory, "cargo")
+
+
+    def installPackages(self, packages: List[str]) -> None:
+        """Waits for the time of a package transaction.
+
+        :param packages: Packages in the transaction.
+        """
+
+        time.sleep(self.processLatency + (self.packageLatency * len(packages)))
+        with self.lock:
+            self.installedPackageCount += len(packages)
+
+
+class FakeAptPackageManager(AptPackageManager):
+    def __init__(self, rootPath: str, latency: BenchmarkLatency):
+        """Creates the fake apt package manager.
+
+        :param rootPath: Root of the fixture to read the dpkg database from.
+        :param latency: Latency of the package transactions.
+        """
+
+        super().__init__(rootPath)
+        self.rootPath = rootPath
+        self.latency = latency
+
+
+    def installPackages(self, packages: List[str]) -> None:
+        """Marks packages as installed after waiting for the transaction latency.
+
+        :param packages: Packages to install.
+        """
+
+        self.latency.installPackages(packages)
+        with open(os.path.join(self.rootPath, "var/lib/dpkg/status"), "a") as file:
+            for package in packages:
+                packageName = normalizePackageName(os.path.basename(package)[:-4] if package.endswith(".deb") else package)
+                self.installedPackages[packageName] = DpkgPackage(packageName, "1.0", "amd64", "install ok installed")
+                file.write("Package: " + packageName + "\nStatus: install ok installed\nArchitecture: amd64\nVersion: 1.0\n\n")
+
+
+    def downloadPackages(self, packages: List[str]) -> List[str]:
+        """Waits for the transaction latency.
+
+        :param packages: Packages to download.
+        :return: Names of the package files, which are not written.
+        """
+
+        self.latency.installPackages(packages)
+        return []
+
+
+class FakePacmanPackageManager(PacmanPackageManager):
+    def __init__(self, keyword: str, rootPath: str, latency: BenchmarkLatency):
+        """Creates the fake pacman package manager.
+
+        :param keyword: Command of the package manager.
+        :param rootPath: Root of the fixture to read the pacman database from.
+        :param latency: Latency of the package transactions.
+        """
+
+        super().__init__(keyword, rootPath)
+        self.rootPath = rootPath
+        self.latency = latency
+
+
+    def installPackages(self, packages: List[str]) -> None:
+        """Marks packages as installed after waiting for the transaction latency.
+
+        :param packages: Packages to install.
+        """
+
+        self.latency.installPackages(packages)
+        for package in packages:
+            packageName = normalizePackageName(package)
+            self.installedPackages.packages[packageName] = PacmanPackage(packageName, "1.0", [])
+            writePacmanPackage(self.rootPath, packageName)
+
+
+    def downloadPackages(self, packages: List[str]) -> List[str]:
+        """Waits for the transaction latency.
+
+        :param packages: Packages to download.
+        :return: Names of the package files, which are not written.
+        """
+
+        self.latency.installPackages(packages)
+        return []
+
+
+class ArtifactRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    artifactSize = 1024 * 1024
+    httpLatency = 0.0
+    bytesSent = 0
+    bytesSentLock = threading.Lock()
+
+
+    def do_GET(self) -> None:
+        """Serves generated artifacts in the format of the mirror.
+        """
+
+        time.sleep(self.httpLatency)
+        parsedPath = urllib.parse.urlsplit(self.path)
+        if parsedPath.path == "/packages/index.json":
+            self.sendBytes(json.dumps({"apt": [], "pacman": []}).encode("utf8"))
+            return
+
+        # Generate the artifact from the hash of the URL.
+        # The contents are text since repository files are read as text.
+        url = urllib.parse.parse_qs(parsedPath.query).get("url", [""])[0]
+        urlHash = hashlib.sha256(url.encode("utf8")).hexdigest()
+        etag = "\"" + urlHash + "\""
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        contents = ((urlHash + "\n") * (self.artifactSize // 65 + 1)).encode("utf8")[0:self.artifactSize]
+        self.sendBytes(contents, etag)
+
+
+    def sendBytes(self, contents: bytes, etag: str = None) -> None:
+        """Sends a response with the given contents.
+
+        :param contents: Contents to send.
+        :param etag: Optional ETag of the contents.
+        """
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(contents)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(contents)
+        with ArtifactRequestHandler.bytesSentLock:
+            ArtifactRequestHandler.bytesSent += len(contents)
+
+
+    def log_message(self, *arguments) -> None:
+        """Ignores the request logs.
+        """
+
+        pass
+
+
+def getPresetPackages(packageManager: str) -> List[str]:
+    """Returns the packages of the presets for a package manager.
+
+    :param packageManager: Name of the package manager.
+    :return: The packages of the presets.
+    """
+
+    packages = []
+    for preset in software.Applications.presets:
+        packages.extend(preset.packages.get(packageManager, []))
+    return list(dict.fromkeys(packages))
+
+
+def generateFixture(rootPath: str, packageCount: int, installedPresetFraction: float) -> None:
+    """Generates the dpkg and pacman databases of a system.
+
+    :param rootPath: Root of the file system to generate the databases in.
+    :param packageCount: Number of installed packages.
+    :param installedPresetFraction: Fraction of the preset packages that are installed.
+    """
+
+    # Determine the package names.
+    packageNames = []
+    for packageManager in ["apt", "pacman"]:
+        presetPackages = getPresetPackages(packageManager)
+        packageNames.extend(presetPackages[0:int(len(presetPackages) * installedPresetFraction)])
+    packageNames = list(dict.fromkeys(packageNames))
+    for packageNumber in range(packageCount - len(packageNames)):
+        packageNames.append("benchmark-package-" + str(packageNumber))
+
+    # Write the dpkg status file.
+    os.makedirs(os.path.join(rootPath, "var/lib/dpkg"), exist_ok=True)
+    with open(os.path.join(rootPath, "var/lib/dpkg/status"), "w") as file:
+        for packageName in packageNames:
+            file.write("Package: " + packageName + "\nStatus: install ok installed\nPriority: optional\nSection: misc\nInstalled-Size: 100\n")
+            file.write("Maintainer: Benchmark <benchmark@localhost>\nArchitecture: amd64\nVersion: 1.0-1\nDepends: libc6 (>= 2.34)\n")
+            file.write("Description: Benchmark package\n Generated package for benchmarking.\n .\n It is not installed.\n\n")
+
+    # Write the pacman local database.
+    for packageName in packageNames:
+        writePacmanPackage(rootPath, packageName)
+
+    # Remove the changes of previous installs.
+    shutil.rmtree(os.path.join(rootPath, "etc/apt/sources.list.d"), ignore_errors=True)
+    shutil.rmtree(os.path.join(rootPath, "usr/share/keyrings"), ignore_errors=True)
+    shutil.rmtree(os.path.join(rootPath, "bin"), ignore_errors=True)
+    with open(os.path.join(rootPath, "var/lib/dpkg/arch"), "w") as file:
+        file.write("amd64\n")
+
+
+def writePacmanPackage(rootPath: str, packageName: str) -> None:
+    """Writes a package to the pacman local database of a fixture.
+
+    :param rootPath: Root of the fixture.
+    :param packageName: Name of the package.
+    """
+
+    packageDirectory = os.path.join(rootPath, "var/lib/pacman/local", packageName + "-1.0-1")
+    os.makedirs(packageDirectory, exist_ok=True)
+    with open(os.path.join(packageDirectory, "desc"), "w") as file:
+        file.write("%NAME%\n" + packageName + "\n\n%VERSION%\n1.0-1\n\n%DESC%\nGenerated package for benchmarking.\n\n")
+        file.write("%ARCH%\nx86_64\n\n%PROVIDES%\n" + packageName + "-provided=1.0\n\n")
+
+
+def createFakeCommand(binDirectory: str, command: str) -> None:
+    """Creates a command that is checked for in the PATH.
+    The command is never run since processes are replaced.
+
+    :param binDirectory: Directory to create the command in.
+    :param command: Name of the command.
+    """
+
+    os.makedirs(binDirectory, exist_ok=True)
+    commandPath = os.path.join(binDirectory, command)
+    with open(commandPath, "w") as file:
+        file.write("#!/bin/sh\nexit 1\n")
+    os.chmod(commandPath, 0o755)
+
+
+def createFakeCommands(binDirectory: str, packageManager: str) -> None:
+    """Creates the commands of a package manager that are checked for in the PATH.
+
+    :param binDirectory: Directory to create the commands in.
+    :param packageManager: Package manager of the system (apt or pacman).
+    """
+
+    for command in (["apt", "apt-get", "dpkg", "add-apt-repository"] if packageManager == "apt" else ["pacman", "yay"]):
+        createFakeCommand(binDirectory, command)
+
+
+def patchGlobal(module: ModuleType, name: str, value: Any) -> None:
+    """Replaces a global of a module until restoreGlobals is called.
+
+    :param module: Module to replace the global of.
+    :param name: Name of the global.
+    :param value: Value to replace the global with.
+    """
+
+    if (module, name) not in patchedGlobals.keys():
+        patchedGlobals[(module, name)] = getattr(module, name)
+    setattr(module, name, value)
+
+
+def restoreGlobals() -> None:
+    """Restores the globals replaced with patchGlobal.
+    """
+
+    for module, name in list(patchedGlobals.keys()):
+        setattr(module, name, patchedGlobals.pop((module, name)))
+
+
+def resetState(rootPath: str, packageManager: str, latency: BenchmarkLatency, mirrorUrl: str) -> None:
+    """Resets the static state of the modules and sets up the fakes for a fixture.
+    The replaced globals are restored with restoreGlobals.
+
+    :param rootPath: Root of the fixture.
+    :param packageManager: Package manager of the system (apt or pacman).
+    :param latency: Latency of the fakes.
+    :param mirrorUrl: URL of the server the downloads are served from.
+    """
+
+    # Replace the package managers.
+    packageManagers = {}
+    if packageManager == "apt":
+        packageManagers["apt"] = FakeAptPackageManager(rootPath, latency)
+    else:
+        packageManagers["pacman"] = FakePacmanPackageManager("pacman", rootPath, latency)
+        packageManagers["yay"] = FakePacmanPackageManager("yay", rootPath, latency)
+    patchGlobal(software.PackageManager, "staticPackageManagers", {})
+    for packageManagerName in packageManagers.keys():
+        packageManagerFuture = Future()
+        packageManagerFuture.set_result(packageManagers[packageManagerName])
+        software.PackageManager.staticPackageManagers[packageManagerName] = packageManagerFuture
+
+    # Replace the processes in all the modules that use them.
+    processModules.clear()
+    for module in list(sys.modules.values()):
+        if module is not helper.Process and getattr(module, "runProcess", None) is helper.Process.runProcess:
+            processModules.append(module)
+    for module in processModules:
+        patchGlobal(module, "runProcess", latency.runProcess)
+
+    # Write the files to the fixture instead of the system.
+    latency.rootPath = rootPath
+    latency.binDirectory = os.path.join(rootPath, "bin")
+    patchGlobal(software.Applications, "getDpkgArchitectures", lambda: getDpkgArchitectures(rootPath))
+    patchGlobal(software.ManagedSoftware, "APT_KEYRING_DIRECTORY", os.path.join(rootPath, "usr/share/keyrings"))
+    patchGlobal(software.ManagedSoftware, "APT_SOURCES_DIRECTORY", os.path.join(rootPath, "etc/apt/sources.list.d"))
+    os.makedirs(software.ManagedSoftware.APT_KEYRING_DIRECTORY, exist_ok=True)
+    os.makedirs(software.ManagedSoftware.APT_SOURCES_DIRECTORY, exist_ok=True)
+    patchGlobal(software.ArchSetup, "setUpArch", lambda: None)
+    patchGlobal(helper.Mirror, "staticMirrorUrl", mirrorUrl)
+    patchGlobal(helper.Mirror, "staticMirrorUrlLoaded", True)
+    patchGlobal(helper.Mirror, "MIRROR_PACKAGE_DIRECTORIES", {
+        "apt": os.path.join(rootPath, "var/cache/apt/archives"),
+        "pacman": os.path.join(rootPath, "var/cache/pacman/pkg"),
+    })
+
+    # Reset the static state.
+    patchGlobal(helper.Cache, "staticArtifactCache", None)
+    patchGlobal(helper.Journal, "staticSystemJournal", None)
+    patchGlobal(helper.Ubuntu, "staticAptIndexTracker", None)
+    patchGlobal(helper.Ubuntu, "staticAptSourceIndex", AptSourceIndex(rootPath))
+    patchGlobal(helper.Path, "staticPathIndex", None)
+    getTracer().spans = []
+
+
+def runInstall(arguments: List[str]) -> Dict[str, float]:
+    """Runs RunInstall.py and returns the time of the phases.
+
+    :param arguments: Arguments to run RunInstall.py with.
+    :return: Wall time in seconds of the install and its phases.
+    """
+
+    # Run the install without the output.
+    sys.argv = ["RunInstall.py"] + arguments
+    startTime = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        runpy.run_path(os.path.join(repositoryDirectory, "RunInstall.py"), run_name="__main__")
+    results = {"total": time.perf_counter() - startTime}
+
+    # Add the time of the phases from the trace.
+    spans = getTracer().spans
+    for span in spans:
+        if span["name"] in ["prefetch", "seedPackageCaches", "updatePackages"] or span["name"].startswith("installQueuedPackages"):
+            results[span["name"].replace(" ", "-")] = span["duration"]
+    prefetchSpans = [span for span in spans if span["name"] == "prefetch"]
+    seedSpans = [span for span in spans if span["name"] == "seedPackageCaches"]
+    if len(prefetchSpans) > 0 and len(seedSpans) > 0:
+        results["presets"] = seedSpans[0]["start"] - (prefetchSpans[0]["start"] + prefetchSpans[0]["duration"])
+    return results
+
+
+def runBenchmark(packageCount: int, arguments: argparse.Namespace, mirrorUrl: str) -> dict:
+    """Runs the benchmark for a fixture with a number of packages.
+
+    :param packageCount: Number of installed packages in the fixture.
+    :param arguments: Arguments of the benchmark.
+    :param mirrorUrl: URL of the server the downloads are served from.
+    :return: Results of the benchmark.
+    """
+
+    rootPath = os.path.join(benchmarkDirectory, "root-" + str(packageCount))
+    results = {"packages": packageCount}
+
+    # Generate the fixture and time reading the databases.
+    startTime = time.perf_counter()
+    generateFixture(rootPath, packageCount, arguments.installed_fraction)
+    results["generateFixture"] = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    readDpkgStatus(rootPath)
+    results["readDpkgStatus"] = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    PacmanDatabase(rootPath)
+    results["readPacmanDatabase"] = time.perf_counter() - startTime
+
+    # Run the install with an empty cache and journal, then run it again.
+    shutil.rmtree(os.environ["NEXUS_SETUP_CACHE_DIRECTORY"], ignore_errors=True)
+    shutil.rmtree(os.environ["NEXUS_SETUP_STATE_DIRECTORY"], ignore_errors=True)
+    latency = BenchmarkLatency(arguments.process_latency, arguments.package_latency)
+    installArguments = ["--jobs", str(arguments.jobs), "--skip", "nexusLULauncher"]
+    createFakeCommands(os.path.join(rootPath, "bin"), arguments.package_manager)
+    originalPath = os.environ.get("PATH", "")
+    originalArguments = sys.argv
+    try:
+        # Only find the fake commands of the fixture in the PATH.
+        os.environ["PATH"] = os.path.join(rootPath, "bin")
+        for runName in ["coldInstall", "warmInstall"]:
+            try:
+                resetState(rootPath, arguments.package_manager, latency, mirrorUrl)
+                ArtifactRequestHandler.bytesSent = 0
+                processCount = len(latency.processes)
+                installedPackageCount = latency.installedPackageCount
+                results[runName] = runInstall(installArguments)
+                results[runName]["processes"] = len(latency.processes) - processCount
+                results[runName]["installedPackages"] = latency.installedPackageCount - installedPackageCount
+                results[runName]["bytesDownloaded"] = ArtifactRequestHandler.bytesSent
+            finally:
+                restoreGlobals()
+    finally:
+        os.environ["PATH"] = originalPath
+        sys.argv = originalArguments
+    return results
+
+
+def main() -> None:
+    """Runs the benchmarks and writes the results.
+    """
+
+    argumentParser = argparse.ArgumentParser(description="Benchmarks RunInstall.py with fake package managers and a local HTTP server.")
+    argumentParser.add_argument("--packages", type=int, nargs="+", default=[5000, 20000, 50000], help="Numbers of installed packages to generate fixtures with.")
+    argumentParser.add_argument("--package-manager", choices=["apt", "pacman"], default="apt", help="Package manager of the simulated system.")
+    argumentParser.add_argument("--installed-fraction", type=float, default=0.5, help="Fraction of the preset packages that are already installed.")
+    argumentParser.add_argument("--process-latency", type=float, default=0.05, help="Time in seconds each process and package transaction takes.")
+    argumentParser.add_argument("--package-latency", type=float, default=0.01, help="Additional time in seconds each package in a transaction takes.")
+    argumentParser.add_argument("--http-latency", type=float, default=0.02, help="Time in seconds each HTTP request takes.")
+    argumentParser.add_argument("--artifact-size", type=int, default=1024 * 1024, help="Size in bytes of each downloaded file.")
+    argumentParser.add_argument("--jobs", type=int, default=4, help="Maximum number of presets to install at once.")
+    argumentParser.add_argument("--output", metavar="PATH", help="File to write the JSON results to. The results are printed if not set.")
+    arguments = argumentParser.parse_args()
+
+    # Start the artifact server and point the downloads at it.
+    ArtifactRequestHandler.artifactSize = arguments.artifact_size
+    ArtifactRequestHandler.httpLatency = arguments.http_latency
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ArtifactRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    mirrorUrl = "http://127.0.0.1:" + str(server.server_address[1])
+    enableTracing()
+
+    # Run the benchmarks.
+    try:
+        results = {
+            "python": sys.version.split(" ")[0],
+            "packageManager": arguments.package_manager,
+            "processLatency": arguments.process_latency,
+            "packageLatency": arguments.package_latency,
+            "httpLatency": arguments.http_latency,
+            "artifactSize": arguments.artifact_size,
+            "jobs": arguments.jobs,
+            "benchmarks": [runBenchmark(packageCount, arguments, mirrorUrl) for packageCount in arguments.packages],
+        }
+    finally:
+        server.shutdown()
+        shutil.rmtree(benchmarkDirectory, ignore_errors=True)
+    resultsJson = json.dumps(results, indent=2)
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            file.write(resultsJson + "\n")
+    else:
+        print(resultsJson)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+TheNexusAvenger
+
+Helper functions for downloading and extracting archives.
+"""
+
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from helper.Cache import getArtifactCache, HASH_CHUNK_SIZE
+
+
+SPOOLED_ARCHIVE_MAX_MEMORY = 64 * 1024 * 1024
+
+
+def extractTarMembers(archive: tarfile.TarFile, destination: str) -> None:
+    """Extracts the members of a tar archive.
+    The data filter is used where it is supported to reject members outside of the destination,
+    links to absolute paths, and device files.
+
+    :param archive: Archive to extract.
+    :param destination: Directory to extract the archive to.
+    """
+
+    if hasattr(tarfile, "data_filter"):
+        archive.extractall(destination, filter="data")
+    else:
+        archive.extractall(destination)
+
+
+def moveExtractedFiles(source: str, destination: str) -> None:
+    """Moves extracted files into a directory, merging them with existing directories.
+
+    :param source: Directory of the extracted files.
+    :param destination: Directory to move the files to.
+    """
+
+    os.makedirs(destination, exist_ok=True)
+    for fileName in os.listdir(source):
+        sourcePath = os.path.join(source, fileName)
+        destinationPath = os.path.join(destination, fileName)
+        if os.path.isdir(sourcePath) and not os.path.islink(sourcePath) and os.path.isdir(destinationPath) and not os.path.islink(destinationPath):
+            moveExtractedFiles(sourcePath, destinationPath)
+            continue
+        if os.path.isdir(destinationPath) and not os.path.islink(destinationPath):
+            shutil.rmtree(destinationPath)
+        os.replace(sourcePath, destinationPath)
+
+
+def extractTarArchive(url: str, destination: str, expectedSha256: str = None) -> None:
+    """Downloads and extracts a tar archive (including .tar.gz) as it is streamed.
+    The archive is stored in the artifact cache as it is read. The archive is extracted to a
+    temporary directory next to the destination and only moved into the destination once the
+    hash is checked.
+
+    :param url: URL of the archive.
+    :param destination: Directory to extract the archive to.
+    :param expectedSha256: Optional SHA-256 hash the archive must have.
+    """
+
+    destination = os.path.abspath(destination)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="." + os.path.basename(destination) + ".", dir=os.path.dirname(destination)) as extractDirectory:
+        with getArtifactCache().openStream(url, expectedSha256) as stream:
+            with tarfile.open(fileobj=stream, mode="r|*") as archive:
+                extractTarMembers(archive, extractDirectory)
+            if hasattr(stream, "verifyHash"):
+                stream.verifyHash()
+        moveExtractedFiles(extractDirectory, destination)
+
+
+def extractZipArchive(url: str, destination: str, expectedSha256: str = None) -> None:
+    """Downloads and extracts a zip archive.
+    Zip files need to be seekable, so uncached archives are read into a spooled buffer
+    that only uses a temporary file if the archive is large. The hash is checked before extracting.
+
+    :param url: URL of the archive.
+    :param destination: Directory to extract the archive to.
+    :param expectedSha256: Optional SHA-256 hash the archive must have.
+    """
+
+    with getArtifactCache().openStream(url, expectedSha256) as stream:
+        # Extract cached files directly.
+        if hasattr(stream, "seekable") and stream.seekable():
+            with zipfile.ZipFile(stream) as archive:
+                archive.extractall(destination)
+            return
+
+        # Read the download into a buffer and check the hash before extracting.
+        with tempfile.SpooledTemporaryFile(max_size=SPOOLED_ARCHIVE_MAX_MEMORY) as buffer:
+            shutil.copyfileobj(stream, buffer, HASH_CHUNK_SIZE)
+            stream.verifyHash()
+            buffer.seek(0)
+            with zipfile.ZipFile(buffer) as archive:
+                archive.extractall(destination)
@@ -0,0 +1,204 @@
+"""
+TheNexusAvenger
+
+Reader for the block devices and where they are mounted.
+"""
+
+import json
+import os
+import re
+import subprocess
+from typing import Dict, List, Optional
+
+staticBlockDeviceTree = None
+
+
+class BlockDevice:
+    def __init__(self, name: str, majorMinor: Optional[str], deviceType: str, partitionNumber: Optional[int] = None, parentName: Optional[str] = None):
+        """Creates the block device entry.
+
+        :param name: Name of the device (ex: sda1).
+        :param majorMinor: Major and minor numbers of the device (ex: 8:1).
+        :param deviceType: Type of the device (disk or part).
+        :param partitionNumber: Number of the partition on its disk, if the device is a partition.
+        :param parentName: Name of the disk of the partition, if the device is a partition.
+        """
+
+        self.name = name
+        self.majorMinor = majorMinor
+        self.deviceType = deviceType
+        self.partitionNumber = partitionNumber
+        self.parentName = parentName
+        self.children: List[str] = []
+        self.mountPoints: List[str] = []
+
+
+    def getDevicePath(self) -> str:
+        """Returns the path of the device file.
+
+        :return: The path of the device in /dev.
+        """
+
+        return "/dev/" + self.name
+
+
+class BlockDeviceTree:
+    def __init__(self, rootPath: str = "/"):
+        """Creates the snapshot of the block devices.
+        The devices are read from /sys/class/block. If it is not available, lsblk is used instead.
+
+        :param rootPath: Root of the file system to read the devices from.
+        """
+
+        self.devices: Dict[str, BlockDevice] = {}
+
+        # Read the devices.
+        sysfsBlockPath = os.path.join(rootPath, "sys/class/block")
+        if os.path.isdir(sysfsBlockPath):
+            self.readSysfs(sysfsBlockPath)
+        elif rootPath == "/":
+            self.readLsblk(subprocess.check_output(["lsblk", "--json", "-o", "NAME,MAJ:MIN,TYPE,MOUNTPOINT"], stderr=subprocess.DEVNULL).decode())
+        for device in self.devices.values():
+            if device.parentName in self.devices.keys():
+                self.devices[device.parentName].children.append(device.name)
+
+        # Read the mount points.
+        mountInfoPath = os.path.join(rootPath, "proc/self/mountinfo")
+        if os.path.exists(mountInfoPath):
+            for device in self.devices.values():
+                device.mountPoints = []
+            with open(mountInfoPath, encoding="utf8", errors="replace") as file:
+                self.readMountInfo(file.read())
+
+
+    @staticmethod
+    def readFile(path: str) -> Optional[str]:
+        """Reads a sysfs attribute file.
+
+        :param path: Path of the file.
+        :return: The contents of the file without whitespace, if it exists.
+        """
+
+        try:
+            with open(path) as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+
+    def readSysfs(self, sysfsBlockPath: str) -> None:
+        """Reads the devices of /sys/class/block.
+        Partitions have a partition file and are in the directory of their disk.
+
+        :param sysfsBlockPath: Path of the block class directory.
+        """
+
+        with os.scandir(sysfsBlockPath) as entries:
+            for entry in entries:
+                partitionNumber = self.readFile(os.path.join(entry.path, "partition"))
+                if partitionNumber is None or not partitionNumber.isdigit():
+                    device = BlockDevice(entry.name, self.readFile(os.path.join(entry.path, "dev")), "disk")
+                else:
+                    parentName = os.path.basename(os.path.dirname(os.path.realpath(entry.path)))
+                    device = BlockDevice(entry.name, self.readFile(os.path.join(entry.path, "dev")), "part", int(partitionNumber), parentName)
+                self.devices[device.name] = device
+
+
+    def readLsblk(self, lsblkOutput: str) -> None:
+        """Reads the devices from the JSON output of lsblk.
+        The partition numbers are read from the end of the names.
+
+        :param lsblkOutput: Output of lsblk --json -o NAME,MAJ:MIN,TYPE,MOUNTPOINT.
+        """
+
+        remainingDevices = [(deviceData, None) for deviceData in json.loads(lsblkOutput).get("blockdevices", [])]
+        while len(remainingDevices) > 0:
+            deviceData, parentName = remainingDevices.pop()
+            partitionNumber = None
+            if deviceData.get("type") == "part":
+                partitionNumberMatch = re.search(r"(\d+)$", deviceData["name"])
+                if partitionNumberMatch is not None:
+                    partitionNumber = int(partitionNumberMatch.group(1))
+            device = BlockDevice(deviceData["name"], deviceData.get("maj:min"), deviceData.get("type", "disk"), partitionNumber, parentName)
+            if deviceData.get("mountpoint") is not None:
+                device.mountPoints.append(deviceData["mountpoint"])
+            self.devices[device.name] = device
+            for childData in deviceData.get("children", []):
+                remainingDevices.append((childData, device.name))
+
+
+    def readMountInfo(self, mountInfo: str) -> None:
+        """Reads the mount points of the devices from the contents of /proc/self/mountinfo.
+        Mounts are matched by the major and minor numbers, or by the source for file systems
+        that report virtual numbers (ex: btrfs).
+
+        :param mountInfo: Contents of the mountinfo file.
+        """
+
+        devicesByMajorMinor = {}
+        for device in self.devices.values():
+            if device.majorMinor is not None:
+                devicesByMajorMinor[device.majorMinor] = device
+        for line in mountInfo.split("\n"):
+            # Lines are "id parentId major:minor root mountPoint options [optional fields] - type source superOptions".
+            fields = line.split()
+            if len(fields) < 5 or "-" not in fields[6:]:
+                continue
+            separatorIndex = fields.index("-", 6)
+            if separatorIndex + 2 >= len(fields):
+                continue
+            mountPoint = re.sub(r"\\([0-7]{3})", lambda match: chr(int(match.group(1), 8)), fields[4])
+            device = devicesByMajorMinor.get(fields[2])
+            mountSource = fields[separatorIndex + 2]
+            if device is None and mountSource.startswith("/dev/"):
+                device = self.devices.get(os.path.basename(mountSource))
+            if device is not None and mountPoint not in device.mountPoints:
+                device.mountPoints.append(mountPoint)
+
+
+    def getDevice(self, name: str) -> Optional[BlockDevice]:
+        """Returns a device by its name.
+
+        :param name: Name of the device (ex: sda1).
+        :return: The device, if it exists.
+        """
+
+        return self.devices.get(name)
+
+
+    def getMountedDevice(self, mountPoint: str) -> Optional[BlockDevice]:
+        """Returns the device mounted at a mount point.
+
+        :param mountPoint: Mount point to find (ex: /boot/efi).
+        :return: The device mounted at the mount point, if there is one.
+        """
+
+        for device in self.devices.values():
+            if mountPoint in device.mountPoints:
+                return device
+        return None
+
+
+    def getParentDisk(self, device: BlockDevice) -> Optional[BlockDevice]:
+        """Returns the disk of a partition.
+
+        :param device: Partition to get the disk of.
+        :return: The disk of the partition, if the device is a partition.
+        """
+
+        if device.parentName is None:
+            return None
+        return self.devices.get(device.parentName)
+
+
+def getBlockDeviceTree() -> BlockDeviceTree:
+    """Returns the static snapshot of the block devices.
+    The devices are read once per run.
+
+    :return: The static block device tree.
+    """
+
+    global staticBlockDeviceTree
+    if staticBlockDeviceTree is None:
+        staticBlockDeviceTree = BlockDeviceTree()
+    return staticBlockDeviceTree
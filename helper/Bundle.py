@@ -0,0 +1,234 @@
+"""
+TheNexusAvenger
+
+Bundles of the downloads and packages of an install for installing without a network.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+from typing import Dict, List, Tuple
+from helper.Cache import getArtifactCache, HASH_CHUNK_SIZE
+from helper.Http import setOffline
+from helper.Mirror import MIRROR_PACKAGE_DIRECTORIES
+from helper.MirrorServer import getPackageIndex
+
+
+BUNDLE_VERSION = 1
+BUNDLE_INDEX_NAME = "index.json"
+APT_LISTS_DIRECTORY = "/var/lib/apt/lists"
+APT_SOURCES_DIRECTORY = "/etc/apt/sources.list.d"
+APT_TRUSTED_KEYS_DIRECTORY = "/etc/apt/trusted.gpg.d"
+PACMAN_SYNC_DIRECTORY = "/var/lib/pacman/sync"
+BUNDLE_SYSTEM_DIRECTORIES = [APT_LISTS_DIRECTORY, APT_SOURCES_DIRECTORY, APT_TRUSTED_KEYS_DIRECTORY, PACMAN_SYNC_DIRECTORY]
+
+
+def getBundleSystemFiles(ppaRepositories: List[str]) -> List[Tuple[str, bool]]:
+    """Returns the system files needed to install the packages of a bundle without a network.
+    The package indexes replace the indexes of the installing machine so that they match the
+    package files. The files of PPA repositories are only added if they are missing, since
+    adding a PPA repository requires a network.
+
+    :param ppaRepositories: PPA repositories the presets add.
+    :return: Paths of the files and whether they replace existing files.
+    """
+
+    systemFiles = []
+
+    # Add the package indexes.
+    for indexDirectory in [APT_LISTS_DIRECTORY, PACMAN_SYNC_DIRECTORY]:
+        if not os.path.isdir(indexDirectory):
+            continue
+        with os.scandir(indexDirectory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name != "lock":
+                    systemFiles.append((entry.path, True))
+
+    # Add the sources and keys written by add-apt-repository (ex: owner-ubuntu-name-jammy.list and owner-ubuntu-name.gpg).
+    for ppaRepository in ppaRepositories:
+        filePrefix = ppaRepository[len("ppa:"):].replace("/", "-ubuntu-", 1)
+        for ppaDirectory in [APT_SOURCES_DIRECTORY, APT_TRUSTED_KEYS_DIRECTORY]:
+            if not os.path.isdir(ppaDirectory):
+                continue
+            for fileName in sorted(os.listdir(ppaDirectory)):
+                if fileName.startswith(filePrefix) and os.path.isfile(os.path.join(ppaDirectory, fileName)):
+                    systemFiles.append((os.path.join(ppaDirectory, fileName), False))
+    return systemFiles
+
+
+def exportBundle(path: str, urls: List[str], packageFiles: Dict[str, List[str]], systemFiles: List[Tuple[str, bool]]) -> None:
+    """Writes a bundle of downloaded files, package files and system files.
+    The files must already be in the artifact cache and package caches. A ValueError is raised
+    if any of the downloads or package files are missing since the presets could not be installed from the bundle.
+    The bundle is an uncompressed tar file since most of the files are already compressed.
+
+    :param path: Path of the bundle to write.
+    :param urls: URLs of the files in the artifact cache to add.
+    :param packageFiles: Names of the package files in the package caches to add by package manager.
+    :param systemFiles: Paths of the system files to add and whether they replace existing files.
+    """
+
+    # Build the index of the bundle.
+    artifactCache = getArtifactCache()
+    cacheIndex = artifactCache.readIndex()
+    bundleIndex = {
+        "version": BUNDLE_VERSION,
+        "created": time.time(),
+        "artifacts": {},
+        "packages": getPackageIndex(packageFiles),
+        "files": [],
+    }
+    missingUrls = []
+    for url in dict.fromkeys(urls):
+        entry = cacheIndex["urls"].get(url)
+        if entry is None or not os.path.exists(artifactCache.getBlobPath(entry["sha256"])):
+            missingUrls.append(url)
+            continue
+        bundleIndex["artifacts"][url] = {
+            "sha256": entry["sha256"],
+            "etag": entry.get("etag"),
+            "lastModified": entry.get("lastModified"),
+        }
+    if len(missingUrls) > 0:
+        raise ValueError("Unable to export the bundle since " + str(len(missingUrls)) + " files were not downloaded: " + ", ".join(missingUrls))
+    for packageManager in packageFiles.keys():
+        indexedPackageFiles = set(packageFile["name"] for packageFile in bundleIndex["packages"].get(packageManager, []))
+        missingPackageFiles = [packageFile for packageFile in packageFiles[packageManager] if packageFile not in indexedPackageFiles]
+        if len(missingPackageFiles) > 0:
+            raise ValueError("Unable to export the bundle since " + str(len(missingPackageFiles)) + " " + packageManager + " package files were not downloaded: " + ", ".join(missingPackageFiles))
+    for systemFilePath, replace in systemFiles:
+        bundleIndex["files"].append({
+            "path": systemFilePath,
+            "replace": replace,
+        })
+
+    # Write the index first so that the bundle can be imported as a stream.
+    partialPath = path + ".part"
+    with tarfile.open(partialPath, "w") as bundle:
+        indexContents = json.dumps(bundleIndex, indent=2).encode("utf8")
+        indexInfo = tarfile.TarInfo(BUNDLE_INDEX_NAME)
+        indexInfo.size = len(indexContents)
+        indexInfo.mtime = int(bundleIndex["created"])
+        bundle.addfile(indexInfo, io.BytesIO(indexContents))
+        for sha256 in dict.fromkeys(artifact["sha256"] for artifact in bundleIndex["artifacts"].values()):
+            bundle.add(artifactCache.getBlobPath(sha256), "artifacts/" + sha256)
+        for packageManager in bundleIndex["packages"].keys():
+            for packageFile in bundleIndex["packages"][packageManager]:
+                bundle.add(os.path.join(MIRROR_PACKAGE_DIRECTORIES[packageManager], packageFile["name"]), "packages/" + packageManager + "/" + packageFile["name"])
+        for fileNumber, systemFile in enumerate(bundleIndex["files"]):
+            bundle.add(systemFile["path"], "files/" + str(fileNumber))
+    os.replace(partialPath, path)
+    packageCount = sum(len(packageFiles) for packageFiles in bundleIndex["packages"].values())
+    print("Wrote " + str(len(bundleIndex["artifacts"])) + " downloads, " + str(packageCount) + " package files and " + str(len(bundleIndex["files"])) + " system files to " + path + ".")
+
+
+def extractBundleFile(bundle: tarfile.TarFile, member: tarfile.TarInfo, path: str) -> str:
+    """Extracts a file of a bundle through a temporary file so that partial files are not used.
+
+    :param bundle: Bundle to extract from.
+    :param member: Member of the file in the bundle.
+    :param path: Path to extract the file to.
+    :return: The SHA-256 hash of the file.
+    """
+
+    fileHash = hashlib.sha256()
+    partialPath = path + ".part"
+    with bundle.extractfile(member) as bundleFile, open(partialPath, "wb") as file:
+        while True:
+            chunk = bundleFile.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            file.write(chunk)
+            fileHash.update(chunk)
+    os.replace(partialPath, path)
+    return fileHash.hexdigest()
+
+
+def importBundle(path: str, includeSystemFiles: bool = True) -> None:
+    """Imports a bundle and disables requests so that the install uses the files of the bundle.
+    The downloads are added to the artifact cache, skipping the files that are already cached.
+    The package files and system files are only added for the system install.
+
+    :param path: Path of the bundle to import.
+    :param includeSystemFiles: Whether to add the package files and system files.
+    """
+
+    artifactCache = getArtifactCache()
+    os.makedirs(artifactCache.blobDirectory, exist_ok=True)
+    importedCount = 0
+    with tarfile.open(path, "r|") as bundle:
+        bundleIndex = None
+        for member in bundle:
+            # Read the index, which is the first file.
+            if bundleIndex is None:
+                if member.name != BUNDLE_INDEX_NAME:
+                    raise ValueError("Bundle " + path + " does not start with an index.")
+                with bundle.extractfile(member) as file:
+                    bundleIndex = json.load(file)
+                if bundleIndex.get("version") != BUNDLE_VERSION:
+                    raise ValueError("Bundle " + path + " has unsupported version " + str(bundleIndex.get("version")) + ".")
+                continue
+            if not member.isfile():
+                continue
+            nameParts = member.name.split("/")
+
+            # Add the downloads to the artifact cache by their hash.
+            if len(nameParts) == 2 and nameParts[0] == "artifacts":
+                sha256 = nameParts[1]
+                if len(sha256) != 64 or any(character not in "0123456789abcdef" for character in sha256):
+                    continue
+                blobPath = artifactCache.getBlobPath(sha256)
+                if os.path.exists(blobPath):
+                    continue
+                if extractBundleFile(bundle, member, blobPath) != sha256:
+                    os.remove(blobPath)
+                    raise ValueError("File " + member.name + " of bundle " + path + " does not match its hash.")
+                importedCount += 1
+            elif not includeSystemFiles:
+                continue
+
+            # Add the package files to the package caches.
+            elif len(nameParts) == 3 and nameParts[0] == "packages" and nameParts[1] in MIRROR_PACKAGE_DIRECTORIES.keys():
+                packageDirectory = MIRROR_PACKAGE_DIRECTORIES[nameParts[1]]
+                packagePath = os.path.join(packageDirectory, nameParts[2])
+                if not os.path.isdir(packageDirectory) or nameParts[2].startswith("."):
+                    continue
+                if os.path.exists(packagePath) and os.path.getsize(packagePath) == member.size:
+                    continue
+                extractBundleFile(bundle, member, packagePath)
+
+            # Add the system files. Only files in the directories of the package indexes and sources can be written.
+            elif len(nameParts) == 2 and nameParts[0] == "files" and nameParts[1].isdigit() and int(nameParts[1]) < len(bundleIndex["files"]):
+                systemFile = bundleIndex["files"][int(nameParts[1])]
+                systemFilePath = os.path.normpath(systemFile["path"])
+                if os.path.dirname(systemFilePath) not in BUNDLE_SYSTEM_DIRECTORIES or not os.path.isdir(os.path.dirname(systemFilePath)):
+                    continue
+                if os.path.exists(systemFilePath) and not systemFile["replace"]:
+                    continue
+                extractBundleFile(bundle, member, systemFilePath)
+
+    # Add the URLs of the downloads to the artifact cache.
+    if bundleIndex is None:
+        raise ValueError("Bundle " + path + " is empty.")
+    with artifactCache.lockIndex():
+        cacheIndex = artifactCache.readIndex()
+        for url in bundleIndex["artifacts"].keys():
+            artifact = bundleIndex["artifacts"][url]
+            blobPath = artifactCache.getBlobPath(artifact["sha256"])
+            if not os.path.exists(blobPath):
+                continue
+            cacheIndex["urls"][url] = {
+                "sha256": artifact["sha256"],
+                "etag": artifact.get("etag"),
+                "lastModified": artifact.get("lastModified"),
+            }
+            cacheIndex["blobs"][artifact["sha256"]] = {
+                "size": os.path.getsize(blobPath),
+                "lastAccess": time.time(),
+            }
+        artifactCache.writeIndex(cacheIndex)
+    print("Imported " + str(importedCount) + " downloads from " + path + ". Requests are disabled for the install.")
+    setOffline(True)
@@ -0,0 +1,557 @@
+"""
+TheNexusAvenger
+
+Persistent cache for downloaded artifacts.
+"""
+
+import fcntl
+import hashlib
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from helper.Http import DOWNLOAD_ATTEMPTS, httpDownload, httpOpen, isOffline, PooledResponse, removePartialDownload
+from helper.Mirror import getMirrorArtifactUrl
+from helper.Trace import addTraceBytesDownloaded, traceSpan
+
+
+DEFAULT_MAX_CACHE_SIZE = 4 * 1024 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+staticArtifactCache = None
+
+
+@contextmanager
+def lockFile(path: str) -> Iterator[None]:
+    """Holds an exclusive lock on a lock file, waiting for other processes and threads that hold it.
+
+    :param path: Path of the lock file. It is created if it does not exist.
+    """
+
+    with open(path, "a") as file:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def getFileSha256(path: str) -> str:
+    """Returns the SHA-256 hash of a file.
+
+    :param path: Path of the file to hash.
+    :return: The hex digest of the file.
+    """
+
+    fileHash = hashlib.sha256()
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            fileHash.update(chunk)
+    return fileHash.hexdigest()
+
+
+class CachingStream:
+    def __init__(self, stream: BinaryIO, path: str, expectedSha256: str = None):
+        """Creates a stream that writes the data that is read from another stream to a file.
+
+        :param stream: Stream to read from.
+        :param path: Path of the file to write to.
+        :param expectedSha256: Optional SHA-256 hash the data must have.
+        """
+
+        self.stream = stream
+        self.file = open(path, "wb")
+        self.hash = hashlib.sha256()
+        self.expectedSha256 = expectedSha256
+
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads from the stream and writes the data to the file.
+
+        :param size: Maximum number of bytes to read.
+        :return: The data that was read.
+        """
+
+        chunk = self.stream.read(size)
+        self.file.write(chunk)
+        self.hash.update(chunk)
+        addTraceBytesDownloaded(len(chunk))
+        return chunk
+
+
+    def readToEnd(self) -> None:
+        """Reads the rest of the stream, such as the padding after the end of an archive.
+        """
+
+        while len(self.read(HASH_CHUNK_SIZE)) > 0:
+            pass
+
+
+    def verifyHash(self) -> None:
+        """Reads the rest of the stream and raises an error if the hash does not match the expected hash.
+        """
+
+        self.readToEnd()
+        if self.expectedSha256 is not None and self.hash.hexdigest() != self.expectedSha256.lower():
+            raise ValueError("SHA-256 hash " + self.hash.hexdigest() + " does not match the expected hash " + self.expectedSha256 + ".")
+
+
+    def close(self) -> None:
+        """Closes the file being written to.
+        """
+
+        self.file.close()
+
+
+class ArtifactCache:
+    def __init__(self, directory: str, maxSize: int = DEFAULT_MAX_CACHE_SIZE):
+        """Creates the artifact cache.
+
+        :param directory: Directory to store the cache in.
+        :param maxSize: Maximum total size of the cached files in bytes.
+        """
+
+        self.directory = directory
+        self.maxSize = maxSize
+        self.indexPath = os.path.join(directory, "index.json")
+        self.blobDirectory = os.path.join(directory, "sha256")
+        self.partialDirectory = os.path.join(directory, "partial")
+        self.lockPath = os.path.join(directory, "index.lock")
+        self.lock = threading.RLock()
+        self.lockDepth = 0
+        self.lockFile = None
+
+
+    @contextmanager
+    def lockIndex(self) -> Iterator[None]:
+        """Holds the lock of the index while it is read and changed.
+        The lock is held across processes with flock since the cache directory can be shared.
+        The lock can be held again by the thread holding it.
+        """
+
+        with self.lock:
+            if self.lockDepth == 0:
+                os.makedirs(self.directory, exist_ok=True)
+                self.lockFile = open(self.lockPath, "a")
+                fcntl.flock(self.lockFile.fileno(), fcntl.LOCK_EX)
+            self.lockDepth += 1
+            try:
+                yield
+            finally:
+                self.lockDepth -= 1
+                if self.lockDepth == 0:
+                    fcntl.flock(self.lockFile.fileno(), fcntl.LOCK_UN)
+                    self.lockFile.close()
+                    self.lockFile = None
+
+
+    def readIndex(self) -> dict:
+        """Reads the index of the cache.
+        The index is re-read each time since the cache directory can be shared.
+
+        :return: The index of the cache.
+        """
+
+        if not os.path.exists(self.indexPath):
+            return {"urls": {}, "blobs": {}}
+        try:
+            with open(self.indexPath) as file:
+                return json.load(file)
+        except ValueError:
+            print("Artifact cache index " + self.indexPath + " is corrupted. Starting a new index.")
+            return {"urls": {}, "blobs": {}}
+
+
+    def writeIndex(self, index: dict) -> None:
+        """Writes the index of the cache.
+
+        :param index: Index to write.
+        """
+
+        temporaryIndexPath = self.indexPath + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(temporaryIndexPath, "w") as file:
+            json.dump(index, file, indent=2, sort_keys=True)
+        os.replace(temporaryIndexPath, self.indexPath)
+
+
+    def getBlobPath(self, sha256: str) -> str:
+        """Returns the path to the cached file with the given hash.
+
+        :param sha256: SHA-256 hash of the file.
+        :return: Path of the cached file.
+        """
+
+        return os.path.join(self.blobDirectory, sha256)
+
+
+    def isCached(self, url: str) -> bool:
+        """Returns if a URL has a cached file.
+
+        :param url: URL to check.
+        :return: Whether the URL has a cached file.
+        """
+
+        with self.lockIndex():
+            entry = self.readIndex()["urls"].get(url)
+            return entry is not None and os.path.exists(self.getBlobPath(entry["sha256"]))
+
+
+    def isCachedReadOnly(self, url: str) -> bool:
+        """Returns if a URL has a cached file without locking or writing to the cache.
+        This is used by plans, which must not change the system. The result may be
+        out of date if another process is writing to the cache.
+
+        :param url: URL to check.
+        :return: Whether the URL has a cached file.
+        """
+
+        if not os.path.exists(self.indexPath):
+            return False
+        try:
+            with open(self.indexPath) as file:
+                entry = json.load(file)["urls"].get(url)
+        except (OSError, ValueError, KeyError):
+            return False
+        return entry is not None and os.path.exists(self.getBlobPath(entry["sha256"]))
+
+
+    def getFileByHash(self, sha256: str) -> Optional[str]:
+        """Returns the path to a cached file with the given hash if it exists.
+
+        :param sha256: SHA-256 hash of the file.
+        :return: Path of the cached file if it exists.
+        """
+
+        with self.lockIndex():
+            blobPath = self.getBlobPath(sha256.lower())
+            if not os.path.exists(blobPath):
+                return None
+            index = self.readIndex()
+            if sha256.lower() in index["blobs"].keys():
+                index["blobs"][sha256.lower()]["lastAccess"] = time.time()
+                self.writeIndex(index)
+            return blobPath
+
+
+    def getFile(self, url: str, expectedSha256: str = None) -> str:
+        """Returns the path to the cached file of a URL.
+        If the file is cached, a conditional request is made to check if it changed.
+        If an expected hash is given, a file with the hash is used without a request
+        and downloads that do not match it are retried before an error is raised.
+
+        :param url: URL to download.
+        :param expectedSha256: Optional SHA-256 hash the file must have.
+        :return: Path of the cached file.
+        """
+
+        # Return the file with the expected hash if it is cached.
+        if expectedSha256 is not None:
+            expectedSha256 = expectedSha256.lower()
+            cachedPath = self.getFileByHash(expectedSha256)
+            if cachedPath is not None:
+                return cachedPath
+
+        # Download the file while holding the lock of the partial file.
+        # Partial files are kept so that they can be resumed, and the lock prevents
+        # other processes and threads from writing to the same partial file.
+        os.makedirs(self.blobDirectory, exist_ok=True)
+        os.makedirs(self.partialDirectory, exist_ok=True)
+        partialPath = os.path.join(self.partialDirectory, hashlib.sha256(url.encode("utf8")).hexdigest())
+        with lockFile(partialPath + ".lock"):
+            return self.downloadToCache(url, partialPath, expectedSha256)
+
+
+    def downloadToCache(self, url: str, partialPath: str, expectedSha256: str = None) -> str:
+        """Downloads a file into the cache, using a conditional request if the file is cached.
+        The lock of the partial file must be held.
+
+        :param url: URL to download.
+        :param partialPath: Path of the partial file to download to.
+        :param expectedSha256: Optional SHA-256 hash the file must have.
+        :return: Path of the cached file.
+        """
+
+        # Return the file with the expected hash if another process downloaded it while waiting for the lock.
+        if expectedSha256 is not None:
+            cachedPath = self.getFileByHash(expectedSha256)
+            if cachedPath is not None:
+                return cachedPath
+
+        with self.lockIndex():
+            entry = self.readIndex()["urls"].get(url)
+            if entry is not None and not os.path.exists(self.getBlobPath(entry["sha256"])):
+                entry = None
+            if expectedSha256 is not None:
+                entry = None
+
+        # Build the conditional request headers.
+        headers = {}
+        if entry is not None:
+            if entry.get("etag") is not None:
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("lastModified") is not None:
+                headers["If-Modified-Since"] = entry["lastModified"]
+
+        # Download the file.
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            try:
+                responseHeaders, sha256 = self.downloadFile(url, partialPath, headers)
+            except urllib.error.HTTPError as error:
+                if error.code != 304 or entry is None:
+                    raise
+                return self.markUsed(url, entry["sha256"])
+            except urllib.error.URLError:
+                if entry is None:
+                    raise
+                if not isOffline():
+                    print("Unable to check " + url + " for changes. Using the cached file.")
+                return self.markUsed(url, entry["sha256"])
+
+            # Discard the download and start over if the hash does not match.
+            if expectedSha256 is None or sha256 == expectedSha256:
+                break
+            removePartialDownload(partialPath)
+            if attempt == DOWNLOAD_ATTEMPTS:
+                raise ValueError("SHA-256 hash " + sha256 + " of " + url + " does not match the expected hash " + expectedSha256 + ".")
+            print("SHA-256 hash of " + url + " does not match the expected hash. Downloading again (attempt " + str(attempt + 1) + " of " + str(DOWNLOAD_ATTEMPTS) + ").")
+
+        # Store the file by its hash.
+        return self.storeFile(url, partialPath, sha256, responseHeaders)
+
+
+    def downloadFile(self, url: str, path: str, headers: Dict[str, str]) -> Tuple[http.client.HTTPMessage, str]:
+        """Downloads a file, using the mirror if one is configured.
+        If the mirror can't be used, the file is downloaded from the original URL.
+
+        :param url: URL to download.
+        :param path: Path of the file to write to.
+        :param headers: Additional headers to set.
+        :return: The headers of the final response and the SHA-256 hash of the file.
+        """
+
+        mirrorUrl = getMirrorArtifactUrl(url)
+        if mirrorUrl is not None:
+            try:
+                return httpDownload(mirrorUrl, path, headers)
+            except urllib.error.HTTPError as error:
+                if error.code == 304:
+                    raise
+            except (OSError, http.client.HTTPException):
+                pass
+            print("Unable to download " + url + " from the mirror. Downloading it directly.")
+            removePartialDownload(path)
+        return httpDownload(url, path, headers)
+
+
+    def storeFile(self, url: str, path: str, sha256: str, responseHeaders: http.client.HTTPMessage) -> str:
+        """Moves a downloaded file into the cache.
+
+        :param url: URL the file was downloaded from.
+        :param path: Path of the downloaded file.
+        :param sha256: SHA-256 hash of the file.
+        :param responseHeaders: Headers of the response the file was downloaded from.
+        :return: Path of the cached file.
+        """
+
+        size = os.path.getsize(path)
+        with self.lockIndex():
+            blobPath = self.getBlobPath(sha256)
+            if os.path.exists(blobPath):
+                os.remove(path)
+            else:
+                os.replace(path, blobPath)
+            index = self.readIndex()
+            index["urls"][url] = {
+                "sha256": sha256,
+                "etag": responseHeaders.get("ETag"),
+                "lastModified": responseHeaders.get("Last-Modified"),
+            }
+            index["blobs"][sha256] = {
+                "size": size,
+                "lastAccess": time.time(),
+            }
+            self.evict(index, sha256)
+            self.writeIndex(index)
+        return blobPath
+
+
+    @contextmanager
+    def openStream(self, url: str, expectedSha256: str = None) -> Iterator[BinaryIO]:
+        """Opens a URL as a stream that is written to the cache while it is read.
+        If the URL is already cached, the cached file is opened instead.
+        The hash is verified once the stream is read to the end, before the file is cached.
+
+        :param url: URL to open.
+        :param expectedSha256: Optional SHA-256 hash the file must have.
+        """
+
+        # Open the cached file if it exists.
+        if self.isCached(url) or (expectedSha256 is not None and self.getFileByHash(expectedSha256) is not None):
+            with open(self.getFile(url, expectedSha256), "rb") as file:
+                yield file
+            return
+
+        # Open the response and write it to the cache as it is read.
+        os.makedirs(self.blobDirectory, exist_ok=True)
+        os.makedirs(self.partialDirectory, exist_ok=True)
+        partialPath = os.path.join(self.partialDirectory, hashlib.sha256(url.encode("utf8")).hexdigest() + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".stream")
+        with traceSpan("Stream " + url, "http"), self.openResponse(url) as response:
+            stream = CachingStream(response, partialPath, expectedSha256)
+            try:
+                yield stream
+                stream.verifyHash()
+            except:
+                stream.close()
+                if os.path.exists(partialPath):
+                    os.remove(partialPath)
+                raise
+            stream.close()
+            self.storeFile(url, partialPath, stream.hash.hexdigest(), response.headers)
+
+
+    def openResponse(self, url: str) -> PooledResponse:
+        """Opens the response of a URL, using the mirror if one is configured.
+
+        :param url: URL to open.
+        :return: The response of the request.
+        """
+
+        mirrorUrl = getMirrorArtifactUrl(url)
+        if mirrorUrl is not None:
+            try:
+                return httpOpen(mirrorUrl)
+            except urllib.error.URLError:
+                print("Unable to download " + url + " from the mirror. Downloading it directly.")
+        return httpOpen(url)
+
+
+    def markUsed(self, url: str, sha256: str) -> str:
+        """Marks a cached file as used for the eviction order.
+
+        :param url: URL of the cached file.
+        :param sha256: SHA-256 hash of the file.
+        :return: Path of the cached file.
+        """
+
+        with self.lockIndex():
+            index = self.readIndex()
+            if sha256 in index["blobs"].keys():
+                index["blobs"][sha256]["lastAccess"] = time.time()
+                self.writeIndex(index)
+        return self.getBlobPath(sha256)
+
+
+    def evict(self, index: dict, keepSha256: str = None) -> None:
+        """Removes the least recently used files until the cache is within the maximum size.
+
+        :param index: Index to remove the entries from.
+        :param keepSha256: Hash of a file to never remove.
+        """
+
+        totalSize = sum(blob["size"] for blob in index["blobs"].values())
+        for sha256 in sorted(index["blobs"].keys(), key=lambda blobHash: index["blobs"][blobHash]["lastAccess"]):
+            if totalSize <= self.maxSize:
+                break
+            if sha256 == keepSha256:
+                continue
+
+            # Remove the file and the URLs that reference it.
+            totalSize -= index["blobs"][sha256]["size"]
+            del index["blobs"][sha256]
+            for url in [url for url in index["urls"].keys() if index["urls"][url]["sha256"] == sha256]:
+                del index["urls"][url]
+            blobPath = self.getBlobPath(sha256)
+            if os.path.exists(blobPath):
+                os.remove(blobPath)
+
+
+def getArtifactCacheDirectory() -> str:
+    """Returns the directory to store the artifact cache in.
+    The NEXUS_SETUP_CACHE_DIRECTORY environment variable can be used to share a cache.
+
+    :return: The directory of the artifact cache.
+    """
+
+    if os.getenv("NEXUS_SETUP_CACHE_DIRECTORY") is not None:
+        return os.getenv("NEXUS_SETUP_CACHE_DIRECTORY")
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        return "/var/cache/nexus-linux-setup"
+    return os.path.expanduser("~/.cache/nexus-linux-setup")
+
+
+def getArtifactCache() -> ArtifactCache:
+    """Returns the static artifact cache.
+
+    :return: The static artifact cache.
+    """
+
+    global staticArtifactCache
+    if staticArtifactCache is None:
+        maxSize = int(os.getenv("NEXUS_SETUP_CACHE_MAX_SIZE", str(DEFAULT_MAX_CACHE_SIZE)))
+        staticArtifactCache = ArtifactCache(getArtifactCacheDirectory(), maxSize)
+    return staticArtifactCache
+
+
+def getExpectedSha256(sha256: Optional[str]) -> Optional[str]:
+    """Returns the expected SHA-256 hash of a file.
+    The hash can be given directly or as the URL of a sidecar file (ex: file.deb.sha256)
+    in the format of sha256sum, which is downloaded to read the hash.
+
+    :param sha256: SHA-256 hash or URL of the sidecar file with the hash.
+    :return: The SHA-256 hash, if one was given.
+    """
+
+    if sha256 is None:
+        return None
+    if sha256.startswith("http"):
+        with open(getArtifactCache().getFile(sha256)) as file:
+            sidecarContents = file.read().split()
+        if len(sidecarContents) == 0:
+            raise ValueError("SHA-256 sidecar file " + sha256 + " is empty.")
+        sha256 = sidecarContents[0]
+    if len(sha256) != 64 or any(character not in "0123456789abcdef" for character in sha256.lower()):
+        raise ValueError("Expected SHA-256 hash " + sha256 + " is not valid.")
+    return sha256.lower()
+
+
+def getCachedFile(url: str, sha256: str = None) -> str:
+    """Returns the path to the cached file of a URL, downloading it if needed.
+
+    :param url: URL to download.
+    :param sha256: Optional SHA-256 hash or URL of a sidecar file with the hash the file must have.
+    :return: Path of the cached file.
+    """
+
+    return getArtifactCache().getFile(url, getExpectedSha256(sha256))
+
+
+def prefetchFiles(urls: List[str], hashes: Dict[str, str] = None, maxWorkers: int = 8) -> None:
+    """Downloads a list of URLs into the artifact cache in parallel.
+    Failed downloads are reported and left to be retried when the file is used.
+
+    :param urls: URLs to download.
+    :param hashes: Optional SHA-256 hashes or URLs of sidecar files with the hashes the files must have.
+    :param maxWorkers: Maximum number of downloads to run at once.
+    """
+
+    urls = list(dict.fromkeys(urls))
+    if len(urls) == 0:
+        return
+    print("Prefetching " + str(len(urls)) + " files.")
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        futures = {}
+        for url in urls:
+            futures[executor.submit(getCachedFile, url, (hashes or {}).get(url))] = url
+        for future in as_completed(futures.keys()):
+            try:
+                future.result()
+            except Exception as error:
+                print("Failed to prefetch " + futures[future] + ": " + str(error))
@@ -0,0 +1,95 @@
+"""
+TheNexusAvenger
+
+Readers for the dpkg database.
+"""
+
+import os
+from typing import Dict, List, Optional
+from helper.PackageName import normalizePackageName
+
+
+class DpkgPackage:
+    def __init__(self, name: str, version: Optional[str], architecture: Optional[str], status: str):
+        """Creates the dpkg package entry.
+
+        :param name: Name of the package.
+        :param version: Version of the package.
+        :param architecture: Architecture of the package.
+        :param status: Status of the package (ex: "install ok installed").
+        """
+
+        self.name = name
+        self.version = version
+        self.architecture = architecture
+        self.status = status
+
+
+    def isInstalled(self) -> bool:
+        """Returns if the package is fully installed.
+
+        :return: Whether the package is installed.
+        """
+
+        return self.status.split(" ")[-1] == "installed"
+
+
+def readDpkgStatus(rootPath: str = "/") -> Dict[str, DpkgPackage]:
+    """Reads the installed packages from the dpkg status database.
+    Packages are stored by name and by "name:architecture".
+
+    :param rootPath: Root of the file system to read the database from.
+    :return: The installed packages.
+    """
+
+    statusPath = os.path.join(rootPath, "var/lib/dpkg/status")
+    packages = {}
+    if not os.path.exists(statusPath):
+        return packages
+
+    def addPackage(fields: Dict[str, str]) -> None:
+        """Adds a package from the fields of a paragraph if it is installed.
+
+        :param fields: Fields of the paragraph.
+        """
+
+        if "package" not in fields.keys():
+            return
+        package = DpkgPackage(normalizePackageName(fields["package"]), fields.get("version"), fields.get("architecture"), fields.get("status", ""))
+        if not package.isInstalled():
+            return
+        packages[package.name] = package
+        if package.architecture is not None:
+            packages[package.name + ":" + package.architecture] = package
+
+    # Read the paragraphs of the file line by line.
+    # Only the single-line fields that are needed are stored.
+    fields = {}
+    with open(statusPath, encoding="utf8", errors="replace") as file:
+        for line in file:
+            if line == "\n":
+                addPackage(fields)
+                fields = {}
+            elif line[0] not in " \t":
+                separatorIndex = line.find(":")
+                if separatorIndex > 0:
+                    fieldName = line[0:separatorIndex].lower()
+                    if fieldName in ("package", "status", "version", "architecture"):
+                        fields[fieldName] = line[separatorIndex + 1:].strip()
+    addPackage(fields)
+    return packages
+
+
+def getDpkgArchitectures(rootPath: str = "/") -> List[str]:
+    """Reads the architectures that dpkg is configured for.
+    Foreign architectures (ex: i386) are listed after they are added with dpkg --add-architecture.
+
+    :param rootPath: Root of the file system to read the database from.
+    :return: The configured architectures.
+    """
+
+    architecturePath = os.path.join(rootPath, "var/lib/dpkg/arch")
+    if not os.path.exists(architecturePath):
+        return []
+    with open(architecturePath) as file:
+        return [line.strip() for line in file.readlines() if line.strip() != ""]
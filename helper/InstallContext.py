@@ -4,8 +4,25 @@ TheNexusAvenger
 Helper context for managing installs.
 """
 
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+from helper.Http import isOffline
+from helper.PackageName import normalizePackageName
 from helper.Process import runProcess
-from software.PackageManager import getPackageManager
+from helper.Trace import traceSpan
+from helper.Ubuntu import refreshAptIndexes
+from software.InstallPlan import InstallPlan
+from software.PackageManager import getPackageManager, getSystemPackageManager
+
+
+RESOURCE_LIMITS = {
+    "network": 4,
+    "cpu": os.cpu_count() or 1,
+    "dpkg": 1,
+    "pacman": 1,
+}
 
 
 class InstallContext:
@@ -13,7 +30,73 @@ class InstallContext:
         """Creates the install context.
         """
 
-        self.queuedPackages = {}
+        self.queuedPackages: Dict[str, Dict[str, str]] = {}
+        self.queuedDebFiles: Dict[str, str] = {}
+        self.queueLock = threading.Lock()
+        self.queueRecording = threading.local()
+        self.installedCallbacks: List[Callable[[], None]] = []
+        self.resourceSemaphores = {}
+        for resourceName in RESOURCE_LIMITS.keys():
+            self.resourceSemaphores[resourceName] = threading.BoundedSemaphore(RESOURCE_LIMITS[resourceName])
+
+
+    @contextmanager
+    def useResources(self, resources: List[str]) -> Iterator[None]:
+        """Acquires resources for the duration of the context.
+        Locked resources, like dpkg and pacman, are only used by 1 thread at a time.
+
+        :param resources: Names of the resources to acquire.
+        """
+
+        # Acquire the resources in a consistent order to prevent deadlocks.
+        resourceNames = sorted(set(resources))
+        for resourceName in resourceNames:
+            if resourceName not in self.resourceSemaphores.keys():
+                raise ValueError("Unknown resource: " + resourceName)
+        acquiredResources = []
+        try:
+            for resourceName in resourceNames:
+                self.resourceSemaphores[resourceName].acquire()
+                acquiredResources.append(resourceName)
+            yield
+        finally:
+            for resourceName in reversed(acquiredResources):
+                self.resourceSemaphores[resourceName].release()
+
+
+    @contextmanager
+    def recordQueuedPackages(self) -> Iterator[List[str]]:
+        """Records the packages and deb files the current thread queues for the duration of the context,
+        such as for determining if an install is complete before the queued packages are installed.
+        """
+
+        queuedNames = []
+        self.queueRecording.queuedNames = queuedNames
+        try:
+            yield queuedNames
+        finally:
+            self.queueRecording.queuedNames = None
+
+
+    def recordQueued(self, names: List[str]) -> None:
+        """Adds queued packages or deb files to the recording of the current thread, if there is one.
+
+        :param names: Names of the queued packages or deb files.
+        """
+
+        queuedNames = getattr(self.queueRecording, "queuedNames", None)
+        if queuedNames is not None:
+            queuedNames.extend(names)
+
+
+    def addInstalledCallback(self, callback: Callable[[], None]) -> None:
+        """Adds a function to run once the queued packages are installed.
+
+        :param callback: Function to run.
+        """
+
+        with self.queueLock:
+            self.installedCallbacks.append(callback)
 
 
     def queuePackage(self, packageManager: str, packageName: str) -> None:
@@ -23,28 +106,126 @@ class InstallContext:
         :param packageName: The package name to install.
         """
 
-        if packageManager not in self.queuedPackages.keys():
-            self.queuedPackages[packageManager] = []
-        if not getPackageManager(packageManager).isPackageInstalled(packageName) and packageName not in self.queuedPackages[packageManager]:
-            self.queuedPackages[packageManager].append(packageName)
+        self.queuePackages(packageManager, [packageName])
+
+
+    def queuePackages(self, packageManager: str, packageNames: List[str]) -> None:
+        """Queues a list of packages to be installed.
+        Packages are queued in order, without duplicates, by their normalized name.
+
+        :param packageManager: The package manager to install with.
+        :param packageNames: The package names to install.
+        """
+
+        # Determine the packages that are missing outside the lock.
+        packageManagerInstance = getPackageManager(packageManager)
+        missingPackages = {}
+        for packageName in packageNames:
+            normalizedPackageName = normalizePackageName(packageName)
+            if normalizedPackageName not in missingPackages.keys() and not packageManagerInstance.isPackageInstalled(normalizedPackageName):
+                missingPackages[normalizedPackageName] = packageName
+
+        # Add the missing packages to the ordered set of the package manager.
+        with self.queueLock:
+            if packageManager not in self.queuedPackages.keys():
+                self.queuedPackages[packageManager] = {}
+            queuedPackages = self.queuedPackages[packageManager]
+            for normalizedPackageName in missingPackages.keys():
+                if normalizedPackageName not in queuedPackages:
+                    queuedPackages[normalizedPackageName] = missingPackages[normalizedPackageName]
+        self.recordQueued(list(missingPackages.values()))
+
+
+    def queueDebFile(self, packageName: str, path: str) -> None:
+        """Queues a deb file to be installed with the queued apt packages.
+
+        :param packageName: The package the deb file installs.
+        :param path: Path of the deb file.
+        """
+
+        with self.queueLock:
+            if "apt" not in self.queuedPackages.keys():
+                self.queuedPackages["apt"] = {}
+            self.queuedDebFiles[packageName] = path
+        self.recordQueued([packageName + ".deb"])
+
+
+    def getQueuedPackageNames(self) -> Dict[str, List[str]]:
+        """Returns the names of the queued packages, including the packages of the queued deb files.
+
+        :return: Names of the queued packages by package manager.
+        """
+
+        with self.queueLock:
+            queuedPackageNames = {}
+            for packageManagerName in self.queuedPackages.keys():
+                queuedPackageNames[packageManagerName] = list(self.queuedPackages[packageManagerName].values())
+            if "apt" in queuedPackageNames.keys():
+                queuedPackageNames["apt"].extend(self.queuedDebFiles.keys())
+            return queuedPackageNames
+
+
+    def getUpdatedPackageManagers(self) -> List[str]:
+        """Returns the package managers to update the packages of.
+        The system package manager is always updated, even if no presets queued packages for it,
+        so that runs where the journal skips every preset still update the system.
+
+        :return: Names of the package managers to update.
+        """
+
+        packageManagerNames = list(self.queuedPackages.keys())
+        systemPackageManager = getSystemPackageManager()
+        if systemPackageManager is not None and systemPackageManager not in packageManagerNames:
+            packageManagerNames.append(systemPackageManager)
+        return packageManagerNames
+
+
+    def plan(self, plan: InstallPlan) -> None:
+        """Adds the package updates and the queued packages to a plan.
+
+        :param plan: Plan to add the changes to.
+        """
+
+        updatedPackageManagers = self.getUpdatedPackageManagers()
+        if "apt" in updatedPackageManagers and not isOffline():
+            plan.addPackageUpdate("apt update && apt upgrade -y")
+        if "pacman" in updatedPackageManagers and not isOffline():
+            plan.addPackageUpdate("pacman --noconfirm -Syu")
+        for packageManagerName in self.queuedPackages.keys():
+            packages = list(self.queuedPackages[packageManagerName].values())
+            if packageManagerName == "apt":
+                packages.extend(debPackage + ".deb" for debPackage in self.queuedDebFiles.keys())
+            plan.addTransaction(packageManagerName, packages)
 
 
     def updatePackages(self) -> None:
-        """Updates the packages of the package managers.
+        """Updates the packages of the system package manager and the package managers with queued packages.
+        Updates are skipped while offline since the newer packages can't be downloaded.
         """
 
-        if "apt" in self.queuedPackages.keys():
-            runProcess(["apt", "update"])
-            runProcess(["apt", "upgrade", "-y"])
-        if "pacman" in self.queuedPackages.keys():
-            runProcess(["pacman", "--noconfirm", "-Syu"])
+        if isOffline():
+            print("Skipping package updates while offline.")
+            return
+        updatedPackageManagers = self.getUpdatedPackageManagers()
+        with traceSpan("updatePackages", "install"):
+            if "apt" in updatedPackageManagers:
+                refreshAptIndexes()
+                runProcess(["apt", "upgrade", "-y"])
+            if "pacman" in updatedPackageManagers:
+                runProcess(["pacman", "--noconfirm", "-Syu"])
 
 
     def installQueuedPackages(self) -> None:
-        """Installs the queued packages.
+        """Installs the queued packages and runs the functions waiting for them to be installed.
         """
 
         for packageManagerName in self.queuedPackages.keys():
-            packages = self.queuedPackages[packageManagerName]
-            if len(packages) > 0:
-                getPackageManager(packageManagerName).installPackages(packages)
+            packages = list(self.queuedPackages[packageManagerName].values())
+            with traceSpan("installQueuedPackages " + packageManagerName, "install", {"packages": packages}):
+                if packageManagerName == "apt" and len(self.queuedDebFiles) > 0:
+                    getPackageManager("apt").installPackagesAndDebFiles(packages, self.queuedDebFiles)
+                elif len(packages) > 0:
+                    getPackageManager(packageManagerName).installPackages(packages)
+        for callback in self.installedCallbacks:
+            callback()
+        self.installedCallbacks = []
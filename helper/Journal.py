@@ -0,0 +1,117 @@
+"""
+TheNexusAvenger
+
+Journal of completed steps for skipping them on reruns.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any
+
+staticSystemJournal = None
+staticUserJournal = None
+
+
+def getFingerprint(inputs: Any) -> str:
+    """Returns the fingerprint of the inputs of a step.
+
+    :param inputs: JSON-serializable inputs of the step.
+    :return: The SHA-256 hash of the inputs.
+    """
+
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf8")).hexdigest()
+
+
+def getFileFingerprint(path: str) -> Any:
+    """Returns the modified time and size of a file to use as the input of a step.
+
+    :param path: Path of the file.
+    :return: The modified time and size of the file, or None if it doesn't exist.
+    """
+
+    if not os.path.exists(path):
+        return None
+    fileStat = os.stat(path)
+    return [fileStat.st_mtime_ns, fileStat.st_size]
+
+
+class StateJournal:
+    def __init__(self, path: str):
+        """Creates the state journal.
+
+        :param path: Path of the journal file.
+        """
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.steps = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as file:
+                    self.steps = json.load(file)["steps"]
+            except (ValueError, KeyError):
+                print("State journal " + path + " is corrupted. Starting a new journal.")
+
+
+    def isStepCompleted(self, name: str, inputs: Any) -> bool:
+        """Returns if a step was completed with the same inputs.
+
+        :param name: Unique name of the step.
+        :param inputs: JSON-serializable inputs of the step.
+        :return: Whether the step was completed with the inputs.
+        """
+
+        with self.lock:
+            return name in self.steps.keys() and self.steps[name]["fingerprint"] == getFingerprint(inputs)
+
+
+    def completeStep(self, name: str, inputs: Any) -> None:
+        """Records a step as completed and writes the journal.
+        The journal is written each time a step is recorded, so steps recorded before a run fails
+        are skipped by the next run. Callers should record each step as soon as it is complete.
+
+        :param name: Unique name of the step.
+        :param inputs: JSON-serializable inputs of the step.
+        """
+
+        with self.lock:
+            self.steps[name] = {
+                "fingerprint": getFingerprint(inputs),
+                "completedAt": time.time(),
+            }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporaryPath = self.path + ".tmp"
+            with open(temporaryPath, "w") as file:
+                json.dump({"steps": self.steps}, file, indent=2, sort_keys=True)
+            os.replace(temporaryPath, self.path)
+
+
+def getSystemJournal() -> StateJournal:
+    """Returns the static journal for the system install.
+    The NEXUS_SETUP_STATE_DIRECTORY environment variable can be used to move it.
+
+    :return: The static system journal.
+    """
+
+    global staticSystemJournal
+    if staticSystemJournal is None:
+        stateDirectory = os.getenv("NEXUS_SETUP_STATE_DIRECTORY", "/var/lib/nexus-linux-setup")
+        staticSystemJournal = StateJournal(os.path.join(stateDirectory, "journal.json"))
+    return staticSystemJournal
+
+
+def getUserJournal() -> StateJournal:
+    """Returns the static journal for the user setup.
+    The NEXUS_SETUP_STATE_DIRECTORY environment variable can be used to move it.
+
+    :return: The static user journal.
+    """
+
+    global staticUserJournal
+    if staticUserJournal is None:
+        stateDirectory = os.getenv("NEXUS_SETUP_STATE_DIRECTORY", os.path.expanduser("~/.local/state/nexus-linux-setup"))
+        staticUserJournal = StateJournal(os.path.join(stateDirectory, "user-journal.json"))
+    return staticUserJournal
@@ -0,0 +1,134 @@
+"""
+TheNexusAvenger
+
+Client for mirrors of the downloads and packages shared between installs.
+"""
+
+import http.client
+import json
+import os
+import urllib.error
+import urllib.parse
+from typing import Dict, List, Optional
+from helper.Http import httpDownload, httpGet, isOffline
+from helper.PackageName import normalizePackageName
+
+
+MIRROR_CONFIG_PATH = "/etc/nexus-linux-setup/mirror"
+MIRROR_PACKAGE_DIRECTORIES = {
+    "apt": "/var/cache/apt/archives",
+    "pacman": "/var/cache/pacman/pkg",
+}
+
+staticMirrorUrl = None
+staticMirrorUrlLoaded = False
+
+
+def getMirrorUrl() -> Optional[str]:
+    """Returns the URL of the mirror to download from.
+    The mirror is read from the NEXUS_SETUP_MIRROR environment variable or the first line of /etc/nexus-linux-setup/mirror.
+    The mirror is not used while offline.
+
+    :return: The URL of the mirror, if one is configured.
+    """
+
+    global staticMirrorUrl, staticMirrorUrlLoaded
+    if isOffline():
+        return None
+    if not staticMirrorUrlLoaded:
+        staticMirrorUrlLoaded = True
+        mirrorUrl = os.getenv("NEXUS_SETUP_MIRROR")
+        if mirrorUrl is None and os.path.exists(MIRROR_CONFIG_PATH):
+            with open(MIRROR_CONFIG_PATH) as file:
+                mirrorUrl = file.readline()
+        if mirrorUrl is not None and mirrorUrl.strip() != "":
+            staticMirrorUrl = mirrorUrl.strip().rstrip("/")
+    return staticMirrorUrl
+
+
+def disableMirror() -> None:
+    """Disables downloading from a mirror, such as when serving the mirror.
+    """
+
+    global staticMirrorUrl, staticMirrorUrlLoaded
+    staticMirrorUrl = None
+    staticMirrorUrlLoaded = True
+
+
+def getMirrorArtifactUrl(url: str) -> Optional[str]:
+    """Returns the URL to download a file from the mirror.
+
+    :param url: Original URL of the file.
+    :return: The URL of the file on the mirror, if a mirror is configured.
+    """
+
+    mirrorUrl = getMirrorUrl()
+    if mirrorUrl is None:
+        return None
+    return mirrorUrl + "/artifact?url=" + urllib.parse.quote(url, safe="")
+
+
+def getPackageFilePackageName(packageManager: str, packageFileName: str) -> str:
+    """Returns the name of the package of a package file.
+    apt files are named "name_version_architecture.deb" and pacman files
+    are named "name-version-release-architecture.pkg.tar.*".
+
+    :param packageManager: Package manager of the file (apt or pacman).
+    :param packageFileName: Name of the package file.
+    :return: The normalized name of the package.
+    """
+
+    if packageManager == "apt":
+        return normalizePackageName(packageFileName.split("_")[0])
+    return normalizePackageName(packageFileName.rsplit("-", 3)[0])
+
+
+def seedPackageCaches(queuedPackages: Dict[str, List[str]]) -> None:
+    """Downloads the package files of the mirror for the queued packages into the package caches of apt and pacman.
+    The package managers use the cached files instead of downloading them again. Nothing is downloaded
+    if no packages are queued so that runs without changes don't download the packages of the mirror.
+
+    :param queuedPackages: Names of the packages that will be installed by package manager.
+    """
+
+    queuedPackageNames = {}
+    for packageManager in queuedPackages.keys():
+        queuedPackageNames[packageManager] = set(normalizePackageName(packageName.split(":")[0]) for packageName in queuedPackages[packageManager])
+    if sum(len(packageNames) for packageNames in queuedPackageNames.values()) == 0:
+        return
+    mirrorUrl = getMirrorUrl()
+    if mirrorUrl is None:
+        return
+    try:
+        packageIndex = json.loads(httpGet(mirrorUrl + "/packages/index.json").decode("utf8"))
+    except urllib.error.URLError as error:
+        print("Unable to read the packages of the mirror " + mirrorUrl + ": " + str(error))
+        return
+
+    # Download the package files that are not cached.
+    for packageManager in MIRROR_PACKAGE_DIRECTORIES.keys():
+        packageDirectory = MIRROR_PACKAGE_DIRECTORIES[packageManager]
+        if not os.path.isdir(packageDirectory):
+            continue
+        missingPackageFiles = []
+        for packageFile in packageIndex.get(packageManager, []):
+            if packageFile["name"] != os.path.basename(packageFile["name"]) or packageFile["name"].startswith("."):
+                continue
+            if getPackageFilePackageName(packageManager, packageFile["name"]) not in queuedPackageNames.get(packageManager, set()):
+                continue
+            packagePath = os.path.join(packageDirectory, packageFile["name"])
+            if not os.path.exists(packagePath) or os.path.getsize(packagePath) != packageFile["size"]:
+                missingPackageFiles.append(packageFile)
+        if len(missingPackageFiles) == 0:
+            continue
+        print("Downloading " + str(len(missingPackageFiles)) + " " + packageManager + " package files from the mirror.")
+        for packageFile in missingPackageFiles:
+            packagePath = os.path.join(packageDirectory, packageFile["name"])
+            partialPath = packagePath + ".part"
+            try:
+                httpDownload(mirrorUrl + "/" + packageManager + "/" + urllib.parse.quote(packageFile["name"]), partialPath, resume=False)
+                os.replace(partialPath, packagePath)
+            except (OSError, http.client.HTTPException) as error:
+                print("Unable to download " + packageFile["name"] + " from the mirror: " + str(error))
+                if os.path.exists(partialPath):
+                    os.remove(partialPath)
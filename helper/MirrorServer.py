@@ -0,0 +1,175 @@
+"""
+TheNexusAvenger
+
+Server for sharing the downloads and packages of an install with other installs.
+"""
+
+import http.server
+import json
+import os
+import shutil
+import urllib.error
+import urllib.parse
+from typing import Dict, List
+from helper.Cache import getArtifactCache, HASH_CHUNK_SIZE
+from helper.Mirror import MIRROR_PACKAGE_DIRECTORIES
+
+
+DEFAULT_MIRROR_BIND_ADDRESS = "127.0.0.1"
+
+
+class MirrorServer(http.server.ThreadingHTTPServer):
+    def __init__(self, bindAddress: str, port: int, allowedUrls: List[str], packageFiles: Dict[str, List[str]]):
+        """Creates the mirror server.
+        Only the downloads and package files of the install are served so that the mirror can't be used as a proxy.
+
+        :param bindAddress: Address to listen on.
+        :param port: Port to listen on.
+        :param allowedUrls: URLs of the downloads that can be requested.
+        :param packageFiles: Names of the package files that can be requested by package manager.
+        """
+
+        super().__init__((bindAddress, port), MirrorRequestHandler)
+        self.allowedUrls = set(allowedUrls)
+        self.packageIndex = getPackageIndex(packageFiles)
+        self.packageFiles = {}
+        for packageManager in self.packageIndex.keys():
+            self.packageFiles[packageManager] = set(packageFile["name"] for packageFile in self.packageIndex[packageManager])
+
+
+class MirrorRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MirrorServer
+
+
+    def do_GET(self) -> None:
+        """Handles a GET request.
+        """
+
+        parsedPath = urllib.parse.urlsplit(self.path)
+        pathParts = parsedPath.path.strip("/").split("/")
+        if parsedPath.path == "/artifact":
+            self.sendArtifact(urllib.parse.parse_qs(parsedPath.query).get("url", [""])[0])
+        elif parsedPath.path == "/packages/index.json":
+            self.sendBytes(json.dumps(self.server.packageIndex).encode("utf8"), "application/json")
+        elif len(pathParts) == 2 and pathParts[0] in self.server.packageFiles.keys():
+            packageName = urllib.parse.unquote(pathParts[1])
+            packagePath = os.path.join(MIRROR_PACKAGE_DIRECTORIES[pathParts[0]], packageName)
+            if packageName not in self.server.packageFiles[pathParts[0]] or not os.path.isfile(packagePath):
+                self.sendError(404)
+            else:
+                self.sendFile(packagePath)
+        else:
+            self.sendError(404)
+
+
+    def sendArtifact(self, url: str) -> None:
+        """Sends a file from the artifact cache, downloading it if it is not cached.
+        Only the downloads of the install can be requested.
+        The hash of the file is used as the ETag so clients can check for changes.
+
+        :param url: Original URL of the file.
+        """
+
+        if url not in self.server.allowedUrls:
+            self.sendError(404)
+            return
+        try:
+            path = getArtifactCache().getFile(url)
+        except urllib.error.HTTPError as error:
+            self.sendError(error.code)
+            return
+        except (OSError, ValueError) as error:
+            print("Unable to download " + url + ": " + str(error))
+            self.sendError(502)
+            return
+        etag = "\"" + os.path.basename(path) + "\""
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.sendFile(path, etag)
+
+
+    def sendFile(self, path: str, etag: str = None) -> None:
+        """Sends a file.
+
+        :param path: Path of the file to send.
+        :param etag: Optional ETag of the file.
+        """
+
+        with open(path, "rb") as file:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(os.fstat(file.fileno()).st_size))
+            if etag is not None:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            shutil.copyfileobj(file, self.wfile, HASH_CHUNK_SIZE)
+
+
+    def sendBytes(self, contents: bytes, contentType: str) -> None:
+        """Sends a response with the given contents.
+
+        :param contents: Contents to send.
+        :param contentType: Content type of the contents.
+        """
+
+        self.send_response(200)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(contents)))
+        self.end_headers()
+        self.wfile.write(contents)
+
+
+    def sendError(self, code: int) -> None:
+        """Sends an empty error response.
+
+        :param code: Status code of the response.
+        """
+
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def getPackageIndex(packageFiles: Dict[str, List[str]]) -> dict:
+    """Returns the package files that can be downloaded from the mirror.
+    Package files that are not in the package caches are not included.
+
+    :param packageFiles: Names of the package files by package manager.
+    :return: Names and sizes of the package files by package manager.
+    """
+
+    packageIndex = {}
+    for packageManager in MIRROR_PACKAGE_DIRECTORIES.keys():
+        packageIndex[packageManager] = []
+        for packageFile in dict.fromkeys(packageFiles.get(packageManager, [])):
+            packagePath = os.path.join(MIRROR_PACKAGE_DIRECTORIES[packageManager], packageFile)
+            if packageFile != os.path.basename(packageFile) or packageFile.startswith(".") or not os.path.isfile(packagePath):
+                continue
+            packageIndex[packageManager].append({
+                "name": packageFile,
+                "size": os.path.getsize(packagePath),
+            })
+    return packageIndex
+
+
+def serveMirror(port: int, allowedUrls: List[str], packageFiles: Dict[str, List[str]], bindAddress: str = DEFAULT_MIRROR_BIND_ADDRESS) -> None:
+    """Serves the downloads and package files of the install until the process is stopped.
+
+    :param port: Port to serve the mirror on.
+    :param allowedUrls: URLs of the downloads that can be requested.
+    :param packageFiles: Names of the package files that can be requested by package manager.
+    :param bindAddress: Address to listen on. Other machines can only use the mirror if it is not a loopback address.
+    """
+
+    server = MirrorServer(bindAddress, port, allowedUrls, packageFiles)
+    print("Serving the mirror on " + bindAddress + ":" + str(port) + ". Set NEXUS_SETUP_MIRROR=http://<host>:" + str(port) + " or write the URL to /etc/nexus-linux-setup/mirror on other machines to use it.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
@@ -0,0 +1,16 @@
+"""
+TheNexusAvenger
+
+Helper for comparing package names.
+"""
+
+
+def normalizePackageName(packageName: str) -> str:
+    """Returns the normalized form of a package name used for lookups.
+    Package names are compared case-insensitively without surrounding whitespace.
+
+    :param packageName: Package name to normalize.
+    :return: The normalized package name.
+    """
+
+    return packageName.strip().lower()
@@ -0,0 +1,111 @@
+"""
+TheNexusAvenger
+
+Reader for the pacman local database.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Set
+from helper.PackageName import normalizePackageName
+
+staticPacmanDatabases = {}
+staticPacmanDatabasesLock = threading.Lock()
+
+
+class PacmanPackage:
+    def __init__(self, name: str, version: Optional[str], provides: List[str]):
+        """Creates the pacman package entry.
+
+        :param name: Name of the package.
+        :param version: Version of the package.
+        :param provides: Names the package provides, without the versions.
+        """
+
+        self.name = name
+        self.version = version
+        self.provides = provides
+
+
+class PacmanDatabase:
+    def __init__(self, rootPath: str = "/"):
+        """Creates the snapshot of the pacman local database.
+
+        :param rootPath: Root of the file system to read the database from.
+        """
+
+        self.packages: Dict[str, PacmanPackage] = {}
+        self.providers: Dict[str, Set[str]] = {}
+
+        # Read the desc file of each installed package.
+        localDatabasePath = os.path.join(rootPath, "var/lib/pacman/local")
+        if not os.path.exists(localDatabasePath):
+            return
+        with os.scandir(localDatabasePath) as entries:
+            for entry in entries:
+                descPath = os.path.join(entry.path, "desc")
+                if entry.is_dir() and os.path.exists(descPath):
+                    package = self.readDesc(descPath)
+                    if package is not None:
+                        self.packages[package.name] = package
+                        for providedName in package.provides:
+                            if providedName not in self.providers.keys():
+                                self.providers[providedName] = set()
+                            self.providers[providedName].add(package.name)
+
+
+    @staticmethod
+    def readDesc(descPath: str) -> Optional[PacmanPackage]:
+        """Reads a package desc file.
+
+        :param descPath: Path of the desc file.
+        :return: The package in the desc file, if it has a name.
+        """
+
+        sections = {}
+        currentSection = None
+        with open(descPath, encoding="utf8", errors="replace") as file:
+            for line in file:
+                line = line.strip()
+                if line == "":
+                    currentSection = None
+                elif line.startswith("%") and line.endswith("%"):
+                    currentSection = line[1:-1]
+                    sections[currentSection] = []
+                elif currentSection is not None:
+                    sections[currentSection].append(line)
+        if len(sections.get("NAME", [])) == 0:
+            return None
+
+        # Remove the versions from the provided names (ex: java-runtime=17).
+        provides = []
+        for providedName in sections.get("PROVIDES", []):
+            for separator in "<>=":
+                providedName = providedName.split(separator)[0]
+            provides.append(normalizePackageName(providedName))
+        version = sections["VERSION"][0] if len(sections.get("VERSION", [])) > 0 else None
+        return PacmanPackage(normalizePackageName(sections["NAME"][0]), version, provides)
+
+
+    def isPackageInstalled(self, package: str) -> bool:
+        """Determines if a package is installed or provided by an installed package.
+
+        :param package: The name of the package to check.
+        :return: Whether it is installed or not.
+        """
+
+        package = normalizePackageName(package)
+        return package in self.packages or package in self.providers
+
+
+def getPacmanDatabase(rootPath: str = "/") -> PacmanDatabase:
+    """Returns the shared snapshot of the pacman local database.
+
+    :param rootPath: Root of the file system to read the database from.
+    :return: The snapshot of the database.
+    """
+
+    with staticPacmanDatabasesLock:
+        if rootPath not in staticPacmanDatabases.keys():
+            staticPacmanDatabases[rootPath] = PacmanDatabase(rootPath)
+        return staticPacmanDatabases[rootPath]
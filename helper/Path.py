@@ -5,7 +5,94 @@ Helper for finding files in the system PATH.
 """
 
 import os
-from typing import Optional
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+staticPathIndex = None
+
+
+class PathIndex:
+    def __init__(self):
+        """Creates the index of the files in the system PATH.
+        """
+
+        self.lock = threading.Lock()
+        self.path = None
+        self.directories: List[str] = []
+        self.directoryEntries: Dict[str, Tuple[Optional[float], Set[str]]] = {}
+
+
+    def scanDirectory(self, directory: str) -> None:
+        """Scans a directory of the PATH once and stores the file names.
+
+        :param directory: Directory to scan.
+        """
+
+        try:
+            modifiedTime = os.stat(directory or ".").st_mtime
+            with os.scandir(directory or ".") as entries:
+                fileNames = set(entry.name for entry in entries)
+        except OSError:
+            modifiedTime = None
+            fileNames = set()
+        self.directoryEntries[directory] = (modifiedTime, fileNames)
+
+
+    def refreshChangedDirectories(self) -> bool:
+        """Rescans the directories of the PATH that were modified since they were scanned.
+
+        :return: Whether any directories were rescanned.
+        """
+
+        directoriesChanged = False
+        for directory in self.directories:
+            try:
+                modifiedTime = os.stat(directory or ".").st_mtime
+            except OSError:
+                modifiedTime = None
+            if self.directoryEntries[directory][0] != modifiedTime:
+                self.scanDirectory(directory)
+                directoriesChanged = True
+        return directoriesChanged
+
+
+    def findFilePath(self, fileName: str) -> Optional[str]:
+        """Finds the full path of a file in the scanned directories.
+
+        :param fileName: Name of the file to find.
+        :return: The path to the file if it was found.
+        """
+
+        for directory in self.directories:
+            if fileName in self.directoryEntries[directory][1]:
+                return os.path.join(directory, fileName)
+        return None
+
+
+    def getFilePath(self, fileName: str) -> Optional[str]:
+        """Finds the full path of a file in the system PATH.
+        Directories are rescanned if the PATH changes or the file is not found
+        in the index and a directory was modified since it was scanned.
+
+        :param fileName: Name of the file to find.
+        :return: The path to the file if it exists.
+        """
+
+        with self.lock:
+            # Rebuild the index if the PATH changed.
+            path = os.getenv("PATH") or ""
+            if path != self.path:
+                self.path = path
+                self.directories = list(dict.fromkeys(path.split(os.pathsep)))
+                self.directoryEntries = {}
+                for directory in self.directories:
+                    self.scanDirectory(directory)
+
+            # Find the file, and rescan the directories if it was added or removed.
+            filePath = self.findFilePath(fileName)
+            if (filePath is None or not os.path.exists(filePath)) and self.refreshChangedDirectories():
+                filePath = self.findFilePath(fileName)
+            return filePath
 
 
 def getFilePath(fileName: str) -> Optional[str]:
@@ -15,11 +102,15 @@ def getFilePath(fileName: str) -> Optional[str]:
     :return: The path to the file if it exists.
     """
 
-    for pathEntry in (os.name == "nt" and os.getenv("PATH").split(";") or os.getenv("PATH").split(":")):
-        filePath = os.path.join(pathEntry, fileName)
-        if os.path.exists(filePath):
-            return filePath
-    return None
+    # Return paths directly instead of searching the PATH.
+    if os.sep in fileName:
+        return fileName if os.path.exists(fileName) else None
+
+    # Search the PATH using the index.
+    global staticPathIndex
+    if staticPathIndex is None:
+        staticPathIndex = PathIndex()
+    return staticPathIndex.getFilePath(fileName)
 
 
 def pathFileExists(fileName: str) -> bool:
@@ -29,4 +120,4 @@ def pathFileExists(fileName: str) -> bool:
     :return: If the file exists in the system PATH.
     """
 
-    return getFilePath(fileName) is not None
\ No newline at end of file
+    return getFilePath(fileName) is not None
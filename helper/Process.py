@@ -4,18 +4,318 @@ TheNexusAvenger
 Helper functions for processes.
 """
 
+import asyncio
+import json
+import os
+import re
+import shlex
+import signal
 import subprocess
-from typing import List
+import sys
+import threading
+import time
+from typing import BinaryIO, List, Optional, Sequence
+from helper.Trace import traceSpan
 
 
-def runProcess(parameters: List[str], workingDirectory: str = None) -> None:
+PROCESS_OUTPUT_CHUNK_SIZE = 64 * 1024
+PROCESS_OUTPUT_CLOSE_TIMEOUT = 5
+
+
+staticProcessLogDirectory = None
+staticProcessLogCount = 0
+staticProcessResults = []
+staticProcessLock = threading.Lock()
+
+
+class ProcessResult:
+    def __init__(self, parameters: List[str], returnCode: Optional[int], startTime: float, duration: float, logPath: Optional[str], timedOut: bool = False):
+        """Creates the result of a process.
+
+        :param parameters: Parameters the process was run with.
+        :param returnCode: Exit code of the process. None if it was not started.
+        :param startTime: Time the process was started, as a Unix timestamp.
+        :param duration: Time the process ran for in seconds.
+        :param logPath: Path of the log file of the output.
+        :param timedOut: Whether the process was stopped for running longer than its timeout.
+        """
+
+        self.parameters = parameters
+        self.returnCode = returnCode
+        self.startTime = startTime
+        self.duration = duration
+        self.logPath = logPath
+        self.timedOut = timedOut
+
+
+    def getCommandLine(self) -> str:
+        """Returns the command line of the process.
+
+        :return: The parameters as a shell command.
+        """
+
+        return " ".join(shlex.quote(parameter) for parameter in self.parameters)
+
+
+    def toJson(self) -> dict:
+        """Returns the result as JSON for the process log.
+
+        :return: JSON-serializable result.
+        """
+
+        return {
+            "parameters": self.parameters,
+            "returnCode": self.returnCode,
+            "startTime": self.startTime,
+            "duration": self.duration,
+            "logPath": self.logPath,
+            "timedOut": self.timedOut,
+        }
+
+
+class ProcessError(Exception):
+    def __init__(self, result: ProcessResult):
+        """Creates the error for a process that failed.
+
+        :param result: Result of the process.
+        """
+
+        if result.timedOut:
+            message = "Process \"" + result.getCommandLine() + "\" timed out after " + str(round(result.duration, 1)) + " seconds"
+        else:
+            message = "Process \"" + result.getCommandLine() + "\" returned an error code " + str(result.returnCode)
+        if result.logPath is not None:
+            message += " (output: " + result.logPath + ")"
+        super().__init__(message)
+        self.result = result
+
+
+def getProcessLogDirectory() -> str:
+    """Returns the directory to write the output of the processes of this run to.
+    The NEXUS_SETUP_LOG_DIRECTORY environment variable can be used to change it.
+
+    :return: The directory of the process logs.
+    """
+
+    global staticProcessLogDirectory
+    with staticProcessLock:
+        if staticProcessLogDirectory is None:
+            logDirectory = os.getenv("NEXUS_SETUP_LOG_DIRECTORY")
+            if logDirectory is None:
+                if hasattr(os, "geteuid") and os.geteuid() == 0:
+                    logDirectory = "/var/log/nexus-linux-setup"
+                else:
+                    logDirectory = os.path.expanduser("~/.local/state/nexus-linux-setup/logs")
+            staticProcessLogDirectory = os.path.join(logDirectory, time.strftime("%Y-%m-%d-%H%M%S") + "-" + str(os.getpid()))
+        return staticProcessLogDirectory
+
+
+def getProcessResults() -> List[ProcessResult]:
+    """Returns the results of the processes that completed in this run.
+
+    :return: The results of the completed processes.
+    """
+
+    with staticProcessLock:
+        return list(staticProcessResults)
+
+
+def recordProcessResult(result: ProcessResult) -> None:
+    """Records the result of a process and appends it to the processes.jsonl file of the log directory.
+
+    :param result: Result to record.
+    """
+
+    with staticProcessLock:
+        staticProcessResults.append(result)
+        if result.logPath is not None:
+            with open(os.path.join(os.path.dirname(result.logPath), "processes.jsonl"), "a") as file:
+                file.write(json.dumps(result.toJson()) + "\n")
+
+
+def shouldLogProcessOutput() -> bool:
+    """Returns if the output of processes should be copied to log files by default.
+    Copying the output requires piping it, which stops processes from writing to the terminal
+    directly (ex: prompts and progress bars), so it is only done when a log directory is set
+    with NEXUS_SETUP_LOG_DIRECTORY or when the output is not a terminal.
+
+    :return: Whether to log the output of processes.
+    """
+
+    return os.getenv("NEXUS_SETUP_LOG_DIRECTORY") is not None or not sys.stdout.isatty()
+
+
+def createProcessLog(parameters: List[str]) -> BinaryIO:
+    """Creates the log file for the output of a process.
+    The files are numbered in the order the processes start.
+
+    :param parameters: Parameters of the process.
+    :return: The opened log file.
+    """
+
+    global staticProcessLogCount
+    logDirectory = getProcessLogDirectory()
+    os.makedirs(logDirectory, exist_ok=True)
+    with staticProcessLock:
+        staticProcessLogCount += 1
+        logNumber = staticProcessLogCount
+        logName = re.sub(r"[^A-Za-z0-9_.-]+", "-", " ".join([os.path.basename(parameters[0])] + parameters[1:3]))[0:60]
+        return open(os.path.join(logDirectory, str(logNumber).zfill(4) + "-" + logName + ".log"), "ab")
+
+
+async def teeProcessOutput(stream: asyncio.StreamReader, output: BinaryIO, logFile: BinaryIO) -> None:
+    """Copies the output of a process to an output and a log file as it is written.
+    Output is copied in chunks instead of lines so that prompts without a newline are shown.
+
+    :param stream: Output stream of the process.
+    :param output: Output to write to, such as stdout.
+    :param logFile: Log file to write to.
+    """
+
+    while True:
+        chunk = await stream.read(PROCESS_OUTPUT_CHUNK_SIZE)
+        if not chunk:
+            break
+        output.write(chunk)
+        output.flush()
+        logFile.write(chunk)
+
+
+async def runProcessAsync(parameters: List[str], workingDirectory: str = None, timeout: float = None, semaphore: asyncio.Semaphore = None) -> ProcessResult:
+    """Runs a process, copying the output to the console and a log file.
+
+    :param parameters: Parameters to run in the process, including the file and parameters to the file.
+    :param workingDirectory: Working directory to run the process.
+    :param timeout: Optional time in seconds to stop the process after.
+    :param semaphore: Optional semaphore for limiting the processes that run at once.
+    :return: The result of the process.
+    """
+
+    if semaphore is not None:
+        async with semaphore:
+            return await runProcessAsync(parameters, workingDirectory, timeout)
+
+    # Start the process.
+    startTime = time.time()
+    startCounter = time.perf_counter()
+    with createProcessLog(parameters) as logFile:
+        logFile.write(("$ " + " ".join(shlex.quote(parameter) for parameter in parameters) + "\n").encode("utf8"))
+        logFile.flush()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Processes with a timeout are started in their own process group so that the processes they start are also stopped.
+        process = await asyncio.create_subprocess_exec(*parameters, cwd=workingDirectory, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=(timeout is not None))
+
+        # Copy the output until the process exits or times out.
+        timedOut = False
+        outputTasks = asyncio.gather(teeProcessOutput(process.stdout, sys.stdout.buffer, logFile), teeProcessOutput(process.stderr, sys.stderr.buffer, logFile))
+        processTasks = asyncio.gather(outputTasks, process.wait())
+        try:
+            await asyncio.wait_for(asyncio.shield(processTasks), timeout)
+        except asyncio.TimeoutError:
+            # Stop the process and the processes it started.
+            timedOut = True
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            try:
+                await asyncio.wait_for(processTasks, PROCESS_OUTPUT_CLOSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+        await process.wait()
+
+    # Record the result.
+    result = ProcessResult(parameters, process.returncode, startTime, time.perf_counter() - startCounter, logFile.name, timedOut)
+    recordProcessResult(result)
+    return result
+
+
+def runInheritedProcess(parameters: List[str], workingDirectory: str = None, timeout: float = None) -> ProcessResult:
+    """Runs a process that writes to the console directly without logging the output.
+
+    :param parameters: Parameters to run in the process, including the file and parameters to the file.
+    :param workingDirectory: Working directory to run the process.
+    :param timeout: Optional time in seconds to stop the process after.
+    :return: The result of the process.
+    """
+
+    # Start the process.
+    startTime = time.time()
+    startCounter = time.perf_counter()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    # Processes with a timeout are started in their own process group so that the processes they start are also stopped.
+    process = subprocess.Popen(parameters, cwd=workingDirectory, start_new_session=(timeout is not None))
+
+    # Wait for the process to exit or time out.
+    timedOut = False
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        timedOut = True
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+    # Record the result.
+    result = ProcessResult(parameters, process.returncode, startTime, time.perf_counter() - startCounter, None, timedOut)
+    recordProcessResult(result)
+    return result
+
+
+async def runProcessesAsync(commands: Sequence[List[str]], maxProcesses: int = 4, timeout: float = None) -> List[ProcessResult]:
+    """Runs processes at the same time, limiting how many run at once.
+    All the processes are run, even if some fail.
+
+    :param commands: Parameters of the processes to run.
+    :param maxProcesses: Maximum number of processes to run at once.
+    :param timeout: Optional time in seconds to stop each process after.
+    :return: The results of the processes, in the order of the commands.
+    """
+
+    semaphore = asyncio.Semaphore(maxProcesses)
+    return list(await asyncio.gather(*[runProcessAsync(parameters, timeout=timeout, semaphore=semaphore) for parameters in commands]))
+
+
+def runProcesses(commands: Sequence[List[str]], maxProcesses: int = 4, timeout: float = None) -> List[ProcessResult]:
+    """Runs processes at the same time and raises an error if any of them failed.
+
+    :param commands: Parameters of the processes to run.
+    :param maxProcesses: Maximum number of processes to run at once.
+    :param timeout: Optional time in seconds to stop each process after.
+    :return: The results of the processes, in the order of the commands.
+    """
+
+    with traceSpan("Run " + str(len(commands)) + " processes", "process", {"commands": [list(parameters) for parameters in commands]}):
+        results = asyncio.run(runProcessesAsync(commands, maxProcesses, timeout))
+    for result in results:
+        if result.returnCode != 0:
+            raise ProcessError(result)
+    return results
+
+
+def runProcess(parameters: List[str], workingDirectory: str = None, timeout: float = None, logOutput: bool = None) -> ProcessResult:
     """Runs a process.
+    By default, the output is only logged if shouldLogProcessOutput returns True. Otherwise, the
+    process writes to the console directly so that interactive commands work.
 
     :param parameters: Parameters to run in the process, including the file and parameters to the file.
     :param workingDirectory: Working directory to run the process.
+    :param timeout: Optional time in seconds to stop the process after.
+    :param logOutput: Optional override for whether to copy the output to a log file.
+    :return: The result of the process.
     """
 
-    process = subprocess.Popen(parameters, cwd=workingDirectory)
-    process.wait()
-    if process.returncode != 0:
-        raise Exception("Process returned an error code " + str(process.returncode))
+    if logOutput is None:
+        logOutput = shouldLogProcessOutput()
+    with traceSpan(" ".join(parameters[0:3]), "process", {"parameters": parameters}):
+        if logOutput:
+            result = asyncio.run(runProcessAsync(parameters, workingDirectory, timeout))
+        else:
+            result = runInheritedProcess(parameters, workingDirectory, timeout)
+    if result.returnCode != 0:
+        raise ProcessError(result)
+    return result
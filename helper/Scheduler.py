@@ -0,0 +1,96 @@
+"""
+TheNexusAvenger
+
+Scheduler for running tasks that depend on each other in parallel.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+
+class ScheduledTask:
+    def __init__(self, name: str, function: Callable[[], None], dependencies: List[str] = None):
+        """Creates the scheduled task.
+
+        :param name: Unique name of the task.
+        :param function: Function to run for the task.
+        :param dependencies: Names of the tasks that must complete before the task runs.
+        """
+
+        self.name = name
+        self.function = function
+        self.dependencies = dependencies or []
+
+
+def getTaskOrder(tasks: List[ScheduledTask]) -> List[ScheduledTask]:
+    """Returns the order to start tasks in so that dependencies start first.
+    Tasks without dependencies between them keep the order they were given in.
+
+    :param tasks: Tasks to order.
+    :return: The ordered tasks.
+    """
+
+    # Validate the dependencies.
+    tasksByName = {}
+    for task in tasks:
+        if task.name in tasksByName.keys():
+            raise ValueError("Task " + task.name + " is defined more than once.")
+        tasksByName[task.name] = task
+    for task in tasks:
+        for dependency in task.dependencies:
+            if dependency not in tasksByName.keys():
+                raise ValueError("Task " + task.name + " depends on unknown task " + dependency + ".")
+
+    # Repeatedly take the first task with all of its dependencies ordered.
+    orderedTasks = []
+    orderedTaskNames = set()
+    remainingTasks = list(tasks)
+    while len(remainingTasks) > 0:
+        for task in remainingTasks:
+            if all(dependency in orderedTaskNames for dependency in task.dependencies):
+                orderedTasks.append(task)
+                orderedTaskNames.add(task.name)
+                remainingTasks.remove(task)
+                break
+        else:
+            raise ValueError("Tasks have a dependency cycle: " + ", ".join(task.name for task in remainingTasks))
+    return orderedTasks
+
+
+def runTasks(tasks: List[ScheduledTask], maxWorkers: int = 1) -> None:
+    """Runs tasks in parallel, starting each task once its dependencies complete.
+    With 1 worker, the tasks run one at a time in the order of getTaskOrder.
+    If a task fails, no new tasks are started and the error is raised once running tasks complete.
+
+    :param tasks: Tasks to run.
+    :param maxWorkers: Maximum number of tasks to run at once.
+    """
+
+    orderedTasks = getTaskOrder(tasks)
+    completedTaskNames = set()
+    runningTasks: Dict[Future, ScheduledTask] = {}
+    firstError = None
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        while True:
+            # Start the tasks that are ready in order.
+            if firstError is None:
+                for task in list(orderedTasks):
+                    if len(runningTasks) >= maxWorkers:
+                        break
+                    if all(dependency in completedTaskNames for dependency in task.dependencies):
+                        orderedTasks.remove(task)
+                        runningTasks[executor.submit(task.function)] = task
+            if len(runningTasks) == 0:
+                break
+
+            # Wait for a task to complete.
+            completedFutures, _ = wait(runningTasks.keys(), return_when=FIRST_COMPLETED)
+            for future in completedFutures:
+                task = runningTasks.pop(future)
+                if future.exception() is not None:
+                    if firstError is None:
+                        firstError = future.exception()
+                else:
+                    completedTaskNames.add(task.name)
+    if firstError is not None:
+        raise firstError
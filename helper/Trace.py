@@ -0,0 +1,193 @@
+"""
+TheNexusAvenger
+
+Helper for timing the steps of the setup.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+staticTracer = None
+
+
+class Tracer:
+    def __init__(self):
+        """Creates the tracer.
+        """
+
+        self.enabled = False
+        self.startTime = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+        self.threadState = threading.local()
+
+
+    def getSpanStack(self) -> List[dict]:
+        """Returns the spans that are open on the current thread.
+
+        :return: The open spans of the current thread.
+        """
+
+        if not hasattr(self.threadState, "spans"):
+            self.threadState.spans = []
+        return self.threadState.spans
+
+
+    @contextmanager
+    def span(self, name: str, category: str, arguments: dict = None) -> Iterator[Optional[dict]]:
+        """Records the time and resources used within the context.
+        Child CPU time is measured for the whole process, so it includes
+        processes started by other threads during the span.
+
+        :param name: Name of the span.
+        :param category: Category of the span (ex: process, http, install).
+        :param arguments: Additional information to store with the span.
+        """
+
+        if not self.enabled:
+            yield None
+            return
+
+        # Start the span.
+        span = {
+            "name": name,
+            "category": category,
+            "arguments": dict(arguments or {}),
+            "threadId": threading.get_ident(),
+            "bytesDownloaded": 0,
+        }
+        spanStack = self.getSpanStack()
+        spanStack.append(span)
+        childUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        startTime = time.perf_counter()
+        try:
+            yield span
+        finally:
+            # Complete the span.
+            endTime = time.perf_counter()
+            endChildUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            spanStack.pop()
+            span["start"] = startTime - self.startTime
+            span["duration"] = endTime - startTime
+            span["childCpuTime"] = (endChildUsage.ru_utime - childUsage.ru_utime) + (endChildUsage.ru_stime - childUsage.ru_stime)
+            span["peakRssKb"] = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, endChildUsage.ru_maxrss)
+            with self.lock:
+                self.spans.append(span)
+
+
+    def addBytesDownloaded(self, byteCount: int) -> None:
+        """Adds downloaded bytes to the open spans of the current thread.
+
+        :param byteCount: Number of bytes that were downloaded.
+        """
+
+        if self.enabled:
+            for span in self.getSpanStack():
+                span["bytesDownloaded"] += byteCount
+
+
+    def writeChromeTrace(self, path: str) -> None:
+        """Writes the spans as a Chrome trace event file.
+        The file can be opened with chrome://tracing or https://ui.perfetto.dev.
+
+        :param path: Path of the file to write.
+        """
+
+        traceEvents = []
+        with self.lock:
+            for span in self.spans:
+                arguments = dict(span["arguments"])
+                arguments["bytesDownloaded"] = span["bytesDownloaded"]
+                arguments["childCpuTime"] = span["childCpuTime"]
+                arguments["peakRssKb"] = span["peakRssKb"]
+                traceEvents.append({
+                    "name": span["name"],
+                    "cat": span["category"],
+                    "ph": "X",
+                    "ts": int(span["start"] * 1000000),
+                    "dur": int(span["duration"] * 1000000),
+                    "pid": os.getpid(),
+                    "tid": span["threadId"],
+                    "args": arguments,
+                })
+        with open(path, "w") as file:
+            json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms"}, file)
+
+
+    def getSummary(self, spanCount: int = 20) -> str:
+        """Returns a text summary of the slowest spans.
+
+        :param spanCount: Maximum number of spans to include.
+        :return: The summary of the slowest spans.
+        """
+
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span["duration"], reverse=True)[0:spanCount]
+        lines = ["Slowest " + str(len(spans)) + " spans:"]
+        lines.append("{:>10}  {:>10}  {:>12}  {:>10}  {:<10}  {}".format("Wall (s)", "CPU (s)", "Downloaded", "Peak RSS", "Category", "Name"))
+        for span in spans:
+            lines.append("{:>10.2f}  {:>10.2f}  {:>12}  {:>10}  {:<10}  {}".format(span["duration"], span["childCpuTime"], str(span["bytesDownloaded"] // 1024) + " KB", str(span["peakRssKb"] // 1024) + " MB", span["category"], span["name"]))
+        return "\n".join(lines)
+
+
+def getTracer() -> Tracer:
+    """Returns the static tracer.
+
+    :return: The static tracer.
+    """
+
+    global staticTracer
+    if staticTracer is None:
+        staticTracer = Tracer()
+    return staticTracer
+
+
+def enableTracing() -> None:
+    """Enables recording spans.
+    """
+
+    getTracer().enabled = True
+
+
+def traceSpan(name: str, category: str, arguments: dict = None):
+    """Records the time and resources used within the context if tracing is enabled.
+
+    :param name: Name of the span.
+    :param category: Category of the span (ex: process, http, install).
+    :param arguments: Additional information to store with the span.
+    """
+
+    return getTracer().span(name, category, arguments)
+
+
+def addTraceBytesDownloaded(byteCount: int) -> None:
+    """Adds downloaded bytes to the open spans of the current thread.
+
+    :param byteCount: Number of bytes that were downloaded.
+    """
+
+    getTracer().addBytesDownloaded(byteCount)
+
+
+def writeTrace(directory: str, name: str) -> None:
+    """Writes the Chrome trace and the summary of the slowest spans if tracing is enabled.
+
+    :param directory: Directory to write the files to.
+    :param name: Name to start the files with.
+    """
+
+    tracer = getTracer()
+    if not tracer.enabled:
+        return
+    os.makedirs(directory, exist_ok=True)
+    summary = tracer.getSummary()
+    tracer.writeChromeTrace(os.path.join(directory, name + "-trace.json"))
+    with open(os.path.join(directory, name + "-summary.txt"), "w") as file:
+        file.write(summary + "\n")
+    print(summary)
+    print("Wrote trace to " + os.path.join(directory, name + "-trace.json"))
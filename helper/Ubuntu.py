@@ -6,38 +6,270 @@ Helper functions for Ubuntu.
 
 import os
 import re
-import tempfile
-from typing import List
-from helper.Http import httpGet
+import threading
+from typing import Optional, Set, Tuple
+from helper.Cache import getCachedFile
+from helper.Http import isOffline
 from helper.Process import runProcess
 
+staticAptIndexTracker = None
+staticAptSourceIndex = None
 
-def getPpaRepositories() -> List[str]:
+
+class AptIndexTracker:
+    def __init__(self):
+        """Creates the tracker for changes to the apt sources.
+        """
+
+        self.lock = threading.Lock()
+        self.indexesRefreshed = False
+        self.pendingChanges = []
+
+
+    def recordSourceChange(self, description: str) -> None:
+        """Records a change to the apt sources that requires the indexes to be refreshed.
+
+        :param description: Description of the change, such as the file that was written.
+        """
+
+        with self.lock:
+            self.pendingChanges.append(description)
+
+
+    def refreshIndexes(self) -> None:
+        """Runs apt update if the indexes were not refreshed during the run
+        or the sources changed since the last refresh.
+        While offline, the indexes can't be downloaded and the existing indexes are used.
+        """
+
+        with self.lock:
+            if self.indexesRefreshed and len(self.pendingChanges) == 0:
+                return
+            if isOffline():
+                print("Skipping apt update while offline.")
+            else:
+                if len(self.pendingChanges) > 0:
+                    print("Refreshing apt indexes for " + str(len(self.pendingChanges)) + " source changes.")
+                runProcess(["apt", "update"])
+            self.indexesRefreshed = True
+            self.pendingChanges = []
+
+
+def getAptIndexTracker() -> AptIndexTracker:
+    """Returns the static tracker for changes to the apt sources.
+
+    :return: The static apt index tracker.
+    """
+
+    global staticAptIndexTracker
+    if staticAptIndexTracker is None:
+        staticAptIndexTracker = AptIndexTracker()
+    return staticAptIndexTracker
+
+
+def recordAptSourceChange(description: str) -> None:
+    """Records a change to the apt sources that requires the indexes to be refreshed.
+    Written source files are also added to the apt source index.
+
+    :param description: Description of the change, such as the file that was written.
+    """
+
+    getAptIndexTracker().recordSourceChange(description)
+    if os.path.isabs(description):
+        getAptSourceIndex().addSourceFile(description)
+
+
+def refreshAptIndexes() -> None:
+    """Refreshes the apt indexes if they are not up to date for the run.
+    """
+
+    getAptIndexTracker().refreshIndexes()
+
+
+class AptSourceIndex:
+    def __init__(self, rootPath: str = "/"):
+        """Creates the index of the apt sources.
+
+        :param rootPath: Root of the file system to read the sources from.
+        """
+
+        self.lock = threading.Lock()
+        self.sourcesListPath = os.path.join(rootPath, "etc/apt/sources.list")
+        self.sourcesDirectoryPath = os.path.join(rootPath, "etc/apt/sources.list.d")
+        self.sourcesDirectoryModifiedTime = None
+        self.sourceFiles = {}
+        self.addedPpaRepositories = set()
+
+
+    @staticmethod
+    def getFileVersion(path: str) -> Optional[Tuple[int, int]]:
+        """Returns the modified time and size of a file to detect changes.
+
+        :param path: Path of the file.
+        :return: The modified time and size of the file, if it exists.
+        """
+
+        try:
+            fileStat = os.stat(path)
+            return fileStat.st_mtime_ns, fileStat.st_size
+        except OSError:
+            return None
+
+
+    @staticmethod
+    def readSourceFileUris(path: str) -> Set[str]:
+        """Reads the repository URIs of an apt sources file.
+        Both one-line (.list) and deb822 (.sources) files are supported.
+
+        :param path: Path of the file to read.
+        :return: The enabled repository URIs in the file.
+        """
+
+        uris = set()
+        with open(path, encoding="utf8", errors="replace") as file:
+            if path.endswith(".sources"):
+                # Read the deb822 paragraphs.
+                paragraphUris = []
+                paragraphEnabled = True
+                for line in file.readlines() + [""]:
+                    line = line.strip()
+                    if line == "":
+                        if paragraphEnabled:
+                            uris.update(paragraphUris)
+                        paragraphUris = []
+                        paragraphEnabled = True
+                    elif not line.startswith("#") and ":" in line:
+                        fieldName, fieldValue = line.split(":", 1)
+                        fieldName = fieldName.strip().lower()
+                        if fieldName == "uris":
+                            paragraphUris.extend(fieldValue.split())
+                        elif fieldName == "enabled":
+                            paragraphEnabled = fieldValue.strip().lower() != "no"
+            else:
+                # Read the one-line entries, skipping the options (ex: [signed-by=...]).
+                for line in file.readlines():
+                    line = line.split("#")[0].strip()
+                    if line.startswith("deb"):
+                        line = re.sub(r"\[[^\]]*\]", " ", line)
+                        parts = line.split()
+                        if len(parts) >= 2:
+                            uris.add(parts[1])
+        return uris
+
+
+    def updateSourceFile(self, path: str) -> None:
+        """Reads a sources file into the index if it changed since it was last read.
+
+        :param path: Path of the file to read.
+        """
+
+        fileVersion = self.getFileVersion(path)
+        if fileVersion is None:
+            if path in self.sourceFiles.keys():
+                del self.sourceFiles[path]
+            return
+        if path in self.sourceFiles.keys() and self.sourceFiles[path]["version"] == fileVersion:
+            return
+        self.sourceFiles[path] = {
+            "version": fileVersion,
+            "uris": self.readSourceFileUris(path),
+        }
+
+
+    def refresh(self) -> None:
+        """Updates the index for the source files that were added, removed, or changed.
+        """
+
+        # Get the list of files if the directory changed.
+        sourcesDirectoryModifiedTime = self.getFileVersion(self.sourcesDirectoryPath)
+        if sourcesDirectoryModifiedTime != self.sourcesDirectoryModifiedTime:
+            self.sourcesDirectoryModifiedTime = sourcesDirectoryModifiedTime
+            filePaths = [self.sourcesListPath]
+            if os.path.isdir(self.sourcesDirectoryPath):
+                for fileName in os.listdir(self.sourcesDirectoryPath):
+                    if fileName.endswith(".list") or fileName.endswith(".sources"):
+                        filePaths.append(os.path.join(self.sourcesDirectoryPath, fileName))
+            for filePath in list(self.sourceFiles.keys()):
+                if filePath not in filePaths:
+                    del self.sourceFiles[filePath]
+            for filePath in filePaths:
+                if filePath not in self.sourceFiles.keys():
+                    self.updateSourceFile(filePath)
+
+        # Re-read the files that changed.
+        for filePath in list(self.sourceFiles.keys()):
+            self.updateSourceFile(filePath)
+
+
+    def addSourceFile(self, path: str) -> None:
+        """Adds or updates a source file in the index after it is written.
+
+        :param path: Path of the file that was written.
+        """
+
+        with self.lock:
+            if path == self.sourcesListPath or os.path.dirname(path) == self.sourcesDirectoryPath:
+                self.updateSourceFile(path)
+
+
+    def addPpaRepository(self, repository: str) -> None:
+        """Adds a PPA repository to the index after it is added.
+
+        :param repository: PPA repository that was added.
+        """
+
+        with self.lock:
+            self.addedPpaRepositories.add(repository)
+
+
+    def getRepositoryUris(self) -> Set[str]:
+        """Returns the URIs of the enabled repositories.
+
+        :return: The URIs of the enabled repositories.
+        """
+
+        with self.lock:
+            self.refresh()
+            uris = set()
+            for sourceFile in self.sourceFiles.values():
+                uris.update(sourceFile["uris"])
+            return uris
+
+
+    def getPpaRepositories(self) -> Set[str]:
+        """Returns the PPA repositories that are installed.
+
+        :return: The PPA repositories that are installed.
+        """
+
+        ppaRepositories = set()
+        for uri in self.getRepositoryUris():
+            for entry in re.findall(r"ppa\.[^/]+/([^/]+)/([^/]+)", uri):
+                ppaRepositories.add("ppa:" + entry[0] + "/" + entry[1])
+        with self.lock:
+            ppaRepositories.update(self.addedPpaRepositories)
+        return ppaRepositories
+
+
+def getAptSourceIndex() -> AptSourceIndex:
+    """Returns the static index of the apt sources.
+
+    :return: The static apt source index.
+    """
+
+    global staticAptSourceIndex
+    if staticAptSourceIndex is None:
+        staticAptSourceIndex = AptSourceIndex()
+    return staticAptSourceIndex
+
+
+def getPpaRepositories() -> Set[str]:
     """Determines the PPA repositories that are installed.
 
     :return: The PPA that are installed.
     """
 
-    # Get the list of files to check.
-    filesList = []
-    if os.path.exists("/etc/apt/sources.list"):
-        filesList.append("/etc/apt/sources.list")
-    if os.path.exists("/etc/apt/sources.list.d/"):
-        for fileName in os.listdir("/etc/apt/sources.list.d/"):
-            filesList.append("/etc/apt/sources.list.d/" + fileName)
-
-    # Find the PPA entries in the files.
-    ppaRepositories = []
-    for filePath in filesList:
-        with open(filePath) as file:
-            for line in file.readlines():
-                line = line.strip()
-                if not line.startswith("#"):
-                    for entry in re.findall(r"ppa\.[^/]+/([^/]+)/([^/]+)", line):
-                        ppaEntry = "ppa:" + entry[0] + "/" + entry[1]
-                        if ppaEntry not in ppaRepositories:
-                            ppaRepositories.append(ppaEntry)
-    return ppaRepositories
+    return getAptSourceIndex().getPpaRepositories()
 
 
 def addPpaRepository(repository: str) -> None:
@@ -46,25 +278,28 @@ def addPpaRepository(repository: str) -> None:
     :param repository: PPA repository to add.
     """
 
-    runProcess(["add-apt-repository", "-y", repository])
-    runProcess(["apt", "update"])
+    # The indexes are refreshed once when a package install needs them instead of after each repository.
+    runProcess(["add-apt-repository", "-y", "-n", repository])
+    getAptSourceIndex().addPpaRepository(repository)
+    recordAptSourceChange(repository)
 
 
-def installDebFile(url: str) -> None:
+def installDebFile(url: str, sha256: str = None) -> None:
     """Downloads and installs a deb file.
+    The hash is verified before dpkg is run.
 
     :param url: URL of the deb file to download and install.
+    :param sha256: Optional SHA-256 hash or URL of a sidecar file with the hash the deb file must have.
     """
 
     # Download the file.
-    path = tempfile.NamedTemporaryFile(suffix=".deb").name
-    with open(path, "wb") as file:
-        file.write(httpGet(url))
+    path = getCachedFile(url, sha256)
 
     try:
         # Install the .deb file.
         runProcess(["dpkg", "-i", path])
     except:
         # Install the dependencies after it fails and try again.
+        refreshAptIndexes()
         runProcess(["apt", "-f", "install", "-y"])
         runProcess(["dpkg", "-i", path])
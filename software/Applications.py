@@ -6,22 +6,60 @@ Applications to install.
 
 import json
 import os
+import shutil
 import stat
-import tempfile
-import zipfile
-from helper.Http import httpGet
+from typing import List
+from helper.Archive import extractZipArchive
+from helper.Cache import getCachedFile
+from helper.Dpkg import getDpkgArchitectures
 from helper.InstallContext import InstallContext
 from helper.Path import pathFileExists
 from helper.Process import runProcess
+from helper.Ubuntu import recordAptSourceChange
 from software.ManagedSoftware import ManagedSoftware
 
 
+NEXUS_LU_LAUNCHER_RELEASE_URL = "https://api.github.com/repos/TheNexusAvenger/Nexus-LU-Launcher/releases/latest"
+NEXUS_LU_LAUNCHER_ICON_URL = "https://raw.githubusercontent.com/TheNexusAvenger/Nexus-LU-Launcher/master/NLUL.GUI/Assets/Images/NexusLegoUniverseLauncherLogo.png"
+
+
+def needsGrapejuiceSources() -> bool:
+    """Returns if the sources for Grapejuice need to be set up.
+
+    :return: Whether the i386 architecture needs to be added.
+    """
+
+    return pathFileExists("apt") and "i386" not in getDpkgArchitectures()
+
+
 def setUpGrapejuiceSources(context: InstallContext) -> None:
     """Sets up the sources for Grapejuice.
     """
 
-    if pathFileExists("apt"):
+    if needsGrapejuiceSources():
         runProcess(["dpkg", "--add-architecture", "i386"])
+        recordAptSourceChange("dpkg --add-architecture i386")
+
+
+def needsNexusLULauncher() -> bool:
+    """Returns if Nexus LU Launcher needs to be installed.
+
+    :return: Whether Nexus LU Launcher is missing.
+    """
+
+    return not os.path.exists("/usr/local/lib/nlul/Nexus-LU-Launcher")
+
+
+def getNexusLULauncherUrls() -> List[str]:
+    """Returns the URL of the archive of the latest release of Nexus LU Launcher.
+    The release is read through the artifact cache so that it can be used offline.
+
+    :return: The URL of the archive.
+    """
+
+    with open(getCachedFile(NEXUS_LU_LAUNCHER_RELEASE_URL)) as file:
+        latestTag = json.load(file)["tag_name"]
+    return ["https://github.com/TheNexusAvenger/Nexus-LU-Launcher/releases/download/" + latestTag + "/Nexus-LU-Launcher-Linux-x64.zip"]
 
 
 def installNexusLULauncher(context: InstallContext) -> None:
@@ -29,19 +67,10 @@ def installNexusLULauncher(context: InstallContext) -> None:
     """
 
     # Download Nexus LU Launcher.
-    if not os.path.exists("/usr/local/lib/nlul/Nexus-LU-Launcher"):
-        # Get the latest tag.
+    if needsNexusLULauncher():
+        # Download and extract the archive of the latest release.
         print("Downloading Nexus LU Launcher")
-        latestTag = json.loads(httpGet("https://github.com/TheNexusAvenger/Nexus-LU-Launcher/releases/latest", {"Accept": "application/json"}).decode("utf8"))["tag_name"]
-
-        # Download the archive.
-        downloadPath = tempfile.NamedTemporaryFile(suffix=".zip").name
-        with open(downloadPath, "wb") as file:
-            file.write(httpGet("https://github.com/TheNexusAvenger/Nexus-LU-Launcher/releases/download/" + latestTag + "/Nexus-LU-Launcher-Linux-x64.zip"))
-
-        # Extract the archive.
-        nlulArchive = zipfile.ZipFile(downloadPath)
-        nlulArchive.extractall("/usr/local/lib/nlul/")
+        extractZipArchive(getNexusLULauncherUrls()[0], "/usr/local/lib/nlul/")
 
         # Make the client executable.
         print("Extracting Nexus LU Launcher")
@@ -52,39 +81,44 @@ def installNexusLULauncher(context: InstallContext) -> None:
         # Download the icon.
         iconLocation = "/usr/local/lib/nlul/NexusLULauncherLogo.png"
         if not os.path.exists(iconLocation):
-            with open(iconLocation, "wb") as file:
-                file.write(httpGet("https://raw.githubusercontent.com/TheNexusAvenger/Nexus-LU-Launcher/master/NLUL.GUI/Assets/Images/NexusLegoUniverseLauncherLogo.png"))
+            shutil.copyfile(getCachedFile(NEXUS_LU_LAUNCHER_ICON_URL), iconLocation)
+
+
+def needsCargo() -> bool:
+    """Returns if the Cargo package manager needs to be installed with rustup.
+
+    :return: Whether Cargo is missing on a system using apt.
+    """
+
+    return not pathFileExists("cargo") and pathFileExists("apt")
 
 
-def prepareRojo(context: InstallContext) -> None:
-    """Installs the Cargo package manager and prepares for Rojo.
+def installCargo(context: InstallContext) -> None:
+    """Installs the Cargo package manager.
     """
 
-    # Install Cargo.
-    if not pathFileExists("cargo") and pathFileExists("apt"):
-        downloadPath = tempfile.NamedTemporaryFile(suffix=".sh").name
-        with open(downloadPath, "wb") as file:
-            file.write(httpGet("https://sh.rustup.rs"))
-        runProcess(["sh", downloadPath])
-        runProcess(["apt", "install", "-y", "pkg-config"])
+    # Install Cargo and queue pkg-config, which Rojo needs to build.
+    if needsCargo():
+        runProcess(["sh", getCachedFile("https://sh.rustup.rs")])
+        context.queuePackages("apt", ["pkg-config"])
 
 
 # Programing Languages
-java = ManagedSoftware()\
+java = ManagedSoftware("java")\
     .addPpaRepository("ppa:linuxuprising/java")\
     .addPackage("apt", "oracle-java17-installer")\
     .addPackage("aur", "jdk")
-dotnet = ManagedSoftware()\
-    .addDebFile("dotnet-sdk-6.0", "https://packages.microsoft.com/config/ubuntu/22.04/packages-microsoft-prod.deb")\
+dotnet = ManagedSoftware("dotnet")\
+    .addDebFile("dotnet-sdk-6.0", "https://packages.microsoft.com/config/ubuntu/22.04/packages-microsoft-prod.deb", True)\
     .addCommonPackage("dotnet-sdk-6.0")\
     .addPackage("apt", "aspnetcore-runtime-6.0")\
     .addPackage("pacman", "aspnet-runtime-6.0")
-pythonPip = ManagedSoftware()\
+pythonPip = ManagedSoftware("pythonPip")\
     .addPackage("apt", "python3-pip")\
     .addPackage("pacman", "python-pip")
 
 # Games
-wine = ManagedSoftware()\
+wine = ManagedSoftware("wine")\
     .addAptKey("winehq-archive.key", "https://dl.winehq.org/wine-builds/winehq.key")\
     .addAptRepository("winehq-jammy.sources", "https://dl.winehq.org/wine-builds/ubuntu/dists/jammy/winehq-jammy.sources")\
     .addPackage("apt", "wine-stable")\
@@ -93,81 +127,83 @@ wine = ManagedSoftware()\
     .addPackage("pacman", "lib32-gnutls")\
     .addPackage("pacman", "libpulse")\
     .addPackage("pacman", "lib32-libpulse")
-grapejuice = ManagedSoftware()\
-    .addStep(setUpGrapejuiceSources)\
+grapejuice = ManagedSoftware("grapejuice")\
+    .addStep(setUpGrapejuiceSources, resources=["dpkg"], required=needsGrapejuiceSources)\
     .addAptKey("grapejuice-archive-keyring.gpg", "https://gitlab.com/brinkervii/grapejuice/-/raw/master/ci_scripts/signing_keys/public_key.gpg")\
     .addAptRepository("grapejuice.list", "deb [signed-by=/usr/share/keyrings/grapejuice-archive-keyring.gpg] https://brinkervii.gitlab.io/grapejuice/repositories/debian/ universal main")\
     .addPackage("apt", "grapejuice")\
     .addPackage("aur", "grapejuice")
-steam = ManagedSoftware()\
+steam = ManagedSoftware("steam")\
     .addPackage("apt", "steam-installer")\
     .addPackage("pacman", "steam")
-minecraft = ManagedSoftware()\
+minecraft = ManagedSoftware("minecraft")\
     .addDebFile("minecraft-launcher", "https://launcher.mojang.com/download/Minecraft.deb")\
     .addPackage("aur", "minecraft-launcher")
-nexusLULauncher = ManagedSoftware()\
-    .addStep(installNexusLULauncher)
+nexusLULauncher = ManagedSoftware("nexusLULauncher")\
+    .addStep(installNexusLULauncher, [NEXUS_LU_LAUNCHER_RELEASE_URL, NEXUS_LU_LAUNCHER_ICON_URL], ["network", "cpu"], needsNexusLULauncher, getNexusLULauncherUrls)
 
 # Text Editors / Development Environments
-vscode = ManagedSoftware()\
+vscode = ManagedSoftware("vscode")\
     .addDebFile("code", "https://code.visualstudio.com/sha/download?build=stable&os=linux-deb-x64")\
     .addPackage("aur", "visual-studio-code-bin")
-vim = ManagedSoftware()\
+vim = ManagedSoftware("vim")\
     .addCommonPackage("vim")
-audacity = ManagedSoftware()\
+audacity = ManagedSoftware("audacity")\
     .addPackage("pacman", "audacity")
     # TODO: Add Ubuntu installer - snap install audacity
 # TODO: Fusion 360
 
 # Communication
-discord = ManagedSoftware()\
+discord = ManagedSoftware("discord")\
     .addDebFile("discord", "https://discordapp.com/api/download?platform=linux&format=deb")\
     .addPackage("pacman", "discord")
-chrome = ManagedSoftware()\
+chrome = ManagedSoftware("chrome")\
     .addDebFile("google-chrome-stable", "https://dl.google.com/linux/direct/google-chrome-stable_current_amd64.deb")\
     .addPackage("aur", "google-chrome")
 
 # GUI Utilities
-sqliteBrowser = ManagedSoftware()\
+sqliteBrowser = ManagedSoftware("sqliteBrowser")\
     .addCommonPackage("sqlitebrowser")
-obs = ManagedSoftware()\
+obs = ManagedSoftware("obs")\
     .addPpaRepository("ppa:obsproject/obs-studio")\
     .addPackage("apt", "ffmpeg")\
     .addPackage("apt", "v4l2loopback-dkms")\
     .addCommonPackage("obs-studio")
-openBoard = ManagedSoftware()\
+openBoard = ManagedSoftware("openBoard")\
     .addPackage("apt", "openboard")\
     .addPackage("aur", "openboard")
-virtualMachineManager = ManagedSoftware()\
+virtualMachineManager = ManagedSoftware("virtualMachineManager")\
     .addCommonPackage("virt-manager")
-balenaEtcher = ManagedSoftware()\
+balenaEtcher = ManagedSoftware("balenaEtcher")\
     .addAptKey("balena-etcher-archive-keyring.gpg", "https://dl.cloudsmith.io/public/balena/etcher/gpg.70528471AFF9A051.key")\
     .addAptRepository("balena-etcher.list", "https://dl.cloudsmith.io/public/balena/etcher/config.deb.txt?distro=ubuntu&codename=jammy&version=22.04&arch=x86_64")\
     .addPackage("apt", "balena-etcher-electron")\
     .addPackage("aur", "balena-etcher")
-gparted = ManagedSoftware()\
+gparted = ManagedSoftware("gparted")\
     .addCommonPackage("gparted")
 
 # Desktop functionality
-wayland = ManagedSoftware()\
+wayland = ManagedSoftware("wayland")\
     .addPackage("pacman", "plasma-wayland-session")
     # TODO: Add Ubuntu installer
-wacomActivePen = ManagedSoftware()\
+wacomActivePen = ManagedSoftware("wacomActivePen")\
     .addPackage("pacman", "kcm-wacomtablet")
     # TODO: Add Ubuntu installer
 
 # CLI Utilities
-neofetch = ManagedSoftware()\
+neofetch = ManagedSoftware("neofetch")\
     .addCommonPackage("neofetch")
-git = ManagedSoftware()\
+git = ManagedSoftware("git")\
     .addCommonPackage("git")
-bashtop = ManagedSoftware()\
+bashtop = ManagedSoftware("bashtop")\
     .addCommonPackage("bashtop")
-tree = ManagedSoftware()\
+tree = ManagedSoftware("tree")\
     .addCommonPackage("tree")
-rojo = ManagedSoftware()\
-    .addStep(prepareRojo)\
+cargo = ManagedSoftware("cargo")\
+    .addStep(installCargo, ["https://sh.rustup.rs"], ["network", "cpu"], needsCargo)\
     .addPackage("pacman", "rustup")
+rojo = ManagedSoftware("rojo")\
+    .addDependency(cargo)
 # TODO: Howdy
 # TODO: Docker? Podman?
 
@@ -176,31 +212,32 @@ rojo = ManagedSoftware()\
 # TODO: ShareX alternative?
 
 # All presets
-presets = {
-    java.install,
-    dotnet.install,
-    pythonPip.install,
-    wine.install,
-    grapejuice.install,
-    steam.install,
-    minecraft.install,
-    nexusLULauncher.install,
-    vscode.install,
-    vim.install,
-    audacity.install,
-    discord.install,
-    chrome.install,
-    sqliteBrowser.install,
-    obs.install,
-    openBoard.install,
-    virtualMachineManager.install,
-    balenaEtcher.install,
-    gparted.install,
-    wayland.install,
-    wacomActivePen.install,
-    neofetch.install,
-    git.install,
-    bashtop.install,
-    tree.install,
-    rojo.install,
-}
\ No newline at end of file
+presets = [
+    java,
+    dotnet,
+    pythonPip,
+    wine,
+    grapejuice,
+    steam,
+    minecraft,
+    nexusLULauncher,
+    vscode,
+    vim,
+    audacity,
+    discord,
+    chrome,
+    sqliteBrowser,
+    obs,
+    openBoard,
+    virtualMachineManager,
+    balenaEtcher,
+    gparted,
+    wayland,
+    wacomActivePen,
+    neofetch,
+    git,
+    bashtop,
+    tree,
+    cargo,
+    rojo,
+]
@@ -5,14 +5,31 @@ Setup specific for Arch Linux.
 """
 
 import os
-import re
 import shutil
-import subprocess
+from helper.BlockDevice import getBlockDeviceTree
 from helper.Path import pathFileExists
 from helper.Process import runProcess
+from software.InstallPlan import InstallPlan
 from software.PackageManager import getPackageManager
 
 
+def planArchSetup(plan: InstallPlan) -> None:
+    """Adds the changes the Arch Linux setup would make to a plan without making them.
+
+    :param plan: Plan to add the changes to.
+    """
+
+    if os.path.exists("/etc/pacman.conf"):
+        with open("/etc/pacman.conf") as file:
+            if "#ParallelDownloads" in file.read():
+                plan.addStep("Enable pacman parallel downloads")
+    if not pathFileExists("yay"):
+        plan.addTransaction("pacman", ["git", "base-devel"])
+        plan.addStep("Install yay")
+    if not pathFileExists("/boot/efi/EFI/BOOT/grubx64.efi"):
+        plan.addStep("Set up Secure Boot")
+
+
 def setUpArch():
     """Sets up specifics for Arch Linux.
     """
@@ -41,27 +58,14 @@ def setUpArch():
     # Set up Secure Boot.
     # TODO: This is incomplete. Potentially missing something for key registration.
     if not pathFileExists("/boot/efi/EFI/BOOT/grubx64.efi"):
-        # Find the boot partitions.
-        efiPartition = None
-        fileSystemPartition = None
-        for line in subprocess.check_output(["lsblk"], stderr=subprocess.DEVNULL).decode().split("\n"):
-            if "part /boot/efi" in line:
-                efiPartition = re.findall(r"[a-zA-Z\d]+", line)[0]
-            elif "part /" in line:
-                fileSystemPartition = re.findall(r"[a-zA-Z\d]+", line)[0]
-
-        # Determine the boot drive and partition number.
-        partitionSameName = ""
-        efiPartitionDifference = ""
-        for i in range(0, len(efiPartition)):
-            character = efiPartition[i]
-            if efiPartitionDifference != "" or character != fileSystemPartition[i]:
-                efiPartitionDifference += character
-            else:
-                partitionSameName += character
-        if partitionSameName.startswith("nvme") and partitionSameName.endswith("p"):
-            partitionSameName = partitionSameName[0:len(partitionSameName) - 1]
-        efiPartitionNumber = re.findall(r"\d+", efiPartitionDifference)[0]
+        # Find the EFI partition and its disk.
+        blockDevices = getBlockDeviceTree()
+        efiPartition = blockDevices.getMountedDevice("/boot/efi")
+        if efiPartition is None or efiPartition.partitionNumber is None:
+            raise ValueError("Unable to find the EFI partition mounted at /boot/efi.")
+        efiDisk = blockDevices.getParentDisk(efiPartition)
+        if efiDisk is None:
+            raise ValueError("Unable to find the disk of the EFI partition " + efiPartition.getDevicePath() + ".")
 
         # Install shim-signed.
         aurPackageManager = getPackageManager("aur")
@@ -78,4 +82,4 @@ def setUpArch():
             shutil.copy("/usr/share/shim-signed/mmx64.efi", "/boot/efi/EFI/BOOT/mmx64.efi")
 
         # Create the NVRAM entry.
-        runProcess(["efibootmgr", "--verbose", "--disk", "/dev/" + partitionSameName, "--part", str(efiPartitionNumber), "--create", "--label", "Arch Secure Boot Shim", "--loader", "/EFI/BOOT/BOOTx64.EFI"])
\ No newline at end of file
+        runProcess(["efibootmgr", "--verbose", "--disk", efiDisk.getDevicePath(), "--part", str(efiPartition.partitionNumber), "--create", "--label", "Arch Secure Boot Shim", "--loader", "/EFI/BOOT/BOOTx64.EFI"])
\ No newline at end of file
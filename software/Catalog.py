@@ -0,0 +1,244 @@
+"""
+TheNexusAvenger
+
+Loader for preset catalogs stored in data files.
+"""
+
+import hashlib
+import json
+import marshal
+import os
+from typing import Dict, List
+from helper.Cache import getArtifactCacheDirectory
+from software.ManagedSoftware import ManagedSoftware
+
+
+CATALOG_CACHE_VERSION = 2
+
+
+class CatalogEntry:
+    __slots__ = ("name", "dependencies", "packages", "debFiles", "aptKeys", "aptRepositories", "ppaRepositories")
+
+    def __init__(self, name: str, dependencies: tuple, packages: tuple, debFiles: tuple, aptKeys: tuple, aptRepositories: tuple, ppaRepositories: tuple):
+        """Creates the catalog entry.
+
+        :param name: Unique name of the software.
+        :param dependencies: Names of the software to install first.
+        :param packages: Pairs of the package manager and package to install.
+        :param debFiles: Tuples of the package, URL, if the deb file adds sources, and the optional SHA-256 hash.
+        :param aptKeys: Tuples of the key name, URL, and the optional SHA-256 hash.
+        :param aptRepositories: Pairs of the list file name and repository.
+        :param ppaRepositories: PPA repositories to add.
+        """
+
+        self.name = name
+        self.dependencies = dependencies
+        self.packages = packages
+        self.debFiles = debFiles
+        self.aptKeys = aptKeys
+        self.aptRepositories = aptRepositories
+        self.ppaRepositories = ppaRepositories
+
+
+    @staticmethod
+    def fromJson(data: dict) -> "CatalogEntry":
+        """Creates a catalog entry from the JSON data of a preset.
+
+        :param data: JSON data of the preset.
+        :return: The catalog entry.
+        """
+
+        packages = []
+        for package in data.get("commonPackages", []):
+            packages.append(("apt", package))
+            packages.append(("pacman", package))
+        for packageManager in data.get("packages", {}).keys():
+            for package in data["packages"][packageManager]:
+                packages.append((packageManager, package))
+        return CatalogEntry(
+            data["name"],
+            tuple(data.get("dependencies", [])),
+            tuple(packages),
+            tuple((debFile["package"], debFile["url"], debFile.get("addsSources", False), debFile.get("sha256")) for debFile in data.get("debFiles", [])),
+            tuple((key["name"], key["url"], key.get("sha256")) for key in data.get("aptKeys", [])),
+            tuple((repository["name"], repository["repository"]) for repository in data.get("aptRepositories", [])),
+            tuple(data.get("ppaRepositories", [])),
+        )
+
+
+    def toTuple(self) -> tuple:
+        """Returns the entry as a tuple for storing in the compiled cache.
+
+        :return: The fields of the entry.
+        """
+
+        return tuple(getattr(self, fieldName) for fieldName in CatalogEntry.__slots__)
+
+
+    def toManagedSoftware(self) -> ManagedSoftware:
+        """Creates the managed software for the entry.
+
+        :return: The managed software of the entry.
+        """
+
+        software = ManagedSoftware(self.name)
+        software.dependencies.extend(self.dependencies)
+        for ppaRepository in self.ppaRepositories:
+            software.addPpaRepository(ppaRepository)
+        for keyName, keyUrl, keySha256 in self.aptKeys:
+            software.addAptKey(keyName, keyUrl, keySha256)
+        for repositoryName, repository in self.aptRepositories:
+            software.addAptRepository(repositoryName, repository)
+        for package, url, addsSources, sha256 in self.debFiles:
+            software.addDebFile(package, url, addsSources, sha256)
+        for packageManager, package in self.packages:
+            software.addPackage(packageManager, package)
+        return software
+
+
+def validateStringList(value, description: str) -> None:
+    """Raises a ValueError if a value of a catalog is not a list of strings.
+
+    :param value: Value to check.
+    :param description: Description of the value for the error.
+    """
+
+    if not isinstance(value, list) or any(not isinstance(item, str) for item in value):
+        raise ValueError(description + " must be a list of strings.")
+
+
+def validateObjectList(value, description: str, stringFields: List[str], optionalFields: Dict[str, type]) -> None:
+    """Raises a ValueError if a value of a catalog is not a list of objects with the given fields.
+
+    :param value: Value to check.
+    :param description: Description of the value for the error.
+    :param stringFields: Fields that each object must have as strings.
+    :param optionalFields: Types of the fields that each object can have. None is allowed for optional fields.
+    """
+
+    if not isinstance(value, list):
+        raise ValueError(description + " must be a list.")
+    for item in value:
+        if not isinstance(item, dict):
+            raise ValueError(description + " must only contain objects.")
+        for fieldName in stringFields:
+            if not isinstance(item.get(fieldName), str):
+                raise ValueError(description + " must have \"" + fieldName + "\" as a string.")
+        for fieldName in optionalFields.keys():
+            if item.get(fieldName) is not None and not isinstance(item[fieldName], optionalFields[fieldName]):
+                raise ValueError(description + " has \"" + fieldName + "\" with the wrong type.")
+
+
+def validateCatalog(catalogData) -> None:
+    """Raises a ValueError if the JSON data of a catalog does not match the format of catalogs.
+
+    :param catalogData: JSON data of the catalog.
+    """
+
+    if not isinstance(catalogData, dict) or not isinstance(catalogData.get("presets"), list):
+        raise ValueError("Catalog must be an object with a \"presets\" list.")
+    for presetNumber, presetData in enumerate(catalogData["presets"]):
+        if not isinstance(presetData, dict):
+            raise ValueError("Preset " + str(presetNumber + 1) + " must be an object.")
+        if not isinstance(presetData.get("name"), str) or presetData["name"] == "":
+            raise ValueError("Preset " + str(presetNumber + 1) + " must have a \"name\".")
+        description = "\"" + presetData["name"] + "\""
+        validateStringList(presetData.get("dependencies", []), "Dependencies of " + description)
+        validateStringList(presetData.get("commonPackages", []), "Common packages of " + description)
+        validateStringList(presetData.get("ppaRepositories", []), "PPA repositories of " + description)
+        packages = presetData.get("packages", {})
+        if not isinstance(packages, dict):
+            raise ValueError("Packages of " + description + " must be an object of package managers to lists of packages.")
+        for packageManager in packages.keys():
+            validateStringList(packages[packageManager], packageManager + " packages of " + description)
+        validateObjectList(presetData.get("debFiles", []), "Deb files of " + description, ["package", "url"], {"addsSources": bool, "sha256": str})
+        validateObjectList(presetData.get("aptKeys", []), "Apt keys of " + description, ["name", "url"], {"sha256": str})
+        validateObjectList(presetData.get("aptRepositories", []), "Apt repositories of " + description, ["name", "repository"], {})
+
+
+def loadCatalog(path: str, writeCache: bool = True) -> List[CatalogEntry]:
+    """Loads the entries of a JSON catalog file.
+    The parsed entries are stored in a compiled cache keyed by the hash of the file
+    so that unchanged catalogs are not parsed again. A ValueError is raised if
+    the catalog does not match the format or defines a preset more than once.
+
+    The file contains a "presets" list. Each preset has a "name" and optionally
+    "dependencies", "packages" (package manager to list of packages), "commonPackages",
+    "debFiles" ("package", "url", "addsSources", "sha256"), "aptKeys" ("name", "url", "sha256"),
+    "aptRepositories" ("name", "repository") and "ppaRepositories".
+
+    :param path: Path of the catalog file.
+    :param writeCache: Whether to write the compiled cache if it does not exist. Plans do not write it.
+    :return: The entries of the catalog.
+    """
+
+    with open(path, "rb") as file:
+        catalogContents = file.read()
+    catalogHash = hashlib.sha256(catalogContents).hexdigest()
+
+    # Read the compiled catalog if it exists.
+    compiledCatalogPath = os.path.join(getArtifactCacheDirectory(), "catalogs", catalogHash + "-" + str(CATALOG_CACHE_VERSION) + ".marshal")
+    if os.path.exists(compiledCatalogPath):
+        try:
+            with open(compiledCatalogPath, "rb") as file:
+                return [CatalogEntry(*entryFields) for entryFields in marshal.load(file)]
+        except (EOFError, ValueError, TypeError):
+            pass
+
+    # Parse the catalog.
+    catalogData = json.loads(catalogContents)
+    validateCatalog(catalogData)
+    entries = [CatalogEntry.fromJson(presetData) for presetData in catalogData["presets"]]
+    entryNames = set()
+    for entry in entries:
+        if entry.name in entryNames:
+            raise ValueError("Preset " + entry.name + " is defined more than once in catalog " + path + ".")
+        entryNames.add(entry.name)
+
+    # Write the compiled catalog.
+    if not writeCache:
+        return entries
+    try:
+        os.makedirs(os.path.dirname(compiledCatalogPath), exist_ok=True)
+        temporaryPath = compiledCatalogPath + "." + str(os.getpid()) + ".tmp"
+        with open(temporaryPath, "wb") as file:
+            marshal.dump([entry.toTuple() for entry in entries], file)
+        os.replace(temporaryPath, compiledCatalogPath)
+    except OSError:
+        pass
+    return entries
+
+
+def selectEntries(entries: List, only: List[str] = None, skip: List[str] = None) -> List:
+    """Selects the presets or catalog entries to install by name.
+    Dependencies of the selected entries are included unless they are skipped.
+    A ValueError is raised if a name or a dependency does not match an entry.
+
+    :param entries: Presets or catalog entries to select from. They must have a name and dependencies.
+    :param only: Names of the entries to select. If not set, all entries are selected.
+    :param skip: Names of the entries to not select.
+    :return: The selected entries, in the original order.
+    """
+
+    entriesByName = {}
+    for entry in entries:
+        entriesByName[entry.name] = entry
+    for name in (only or []) + (skip or []):
+        if name not in entriesByName.keys():
+            raise ValueError("Unknown preset: " + name)
+    for entry in entries:
+        for dependencyName in entry.dependencies:
+            if dependencyName not in entriesByName.keys():
+                raise ValueError("Preset " + entry.name + " depends on unknown preset: " + dependencyName)
+
+    # Add the selected entries and their dependencies.
+    skippedNames = set(skip or [])
+    selectedNames = set()
+    remainingNames = list(only) if only is not None else list(entriesByName.keys())
+    while len(remainingNames) > 0:
+        name = remainingNames.pop()
+        if name in selectedNames or name in skippedNames or name not in entriesByName.keys():
+            continue
+        selectedNames.add(name)
+        remainingNames.extend(entriesByName[name].dependencies)
+    return [entry for entry in entries if entry.name in selectedNames]
@@ -0,0 +1,110 @@
+"""
+TheNexusAvenger
+
+Plan of the changes an install would make.
+"""
+
+from typing import Dict, List
+from helper.Cache import getArtifactCache
+
+
+class InstallPlan:
+    def __init__(self):
+        """Creates the install plan.
+        """
+
+        self.downloads = []
+        self.sourceWrites = []
+        self.steps = []
+        self.transactions: Dict[str, List[str]] = {}
+        self.packageUpdates = []
+
+
+    def addDownload(self, url: str) -> None:
+        """Adds a file that would be downloaded.
+
+        :param url: URL of the file.
+        """
+
+        if url not in self.downloads:
+            self.downloads.append(url)
+
+
+    def addSourceWrite(self, description: str) -> None:
+        """Adds a change to the package sources, like a key, list file or PPA.
+
+        :param description: Description of the change.
+        """
+
+        self.sourceWrites.append(description)
+
+
+    def addStep(self, description: str) -> None:
+        """Adds a step that would run.
+
+        :param description: Description of the step.
+        """
+
+        self.steps.append(description)
+
+
+    def addTransaction(self, packageManager: str, packages: List[str]) -> None:
+        """Adds packages that would be installed by a package manager.
+
+        :param packageManager: Package manager that would install the packages.
+        :param packages: Packages or files that would be installed.
+        """
+
+        if len(packages) == 0:
+            return
+        if packageManager not in self.transactions.keys():
+            self.transactions[packageManager] = []
+        self.transactions[packageManager].extend(packages)
+
+
+    def addPackageUpdate(self, description: str) -> None:
+        """Adds an update of the installed packages.
+        Updates always run, so they do not count as pending changes.
+
+        :param description: Description of the update.
+        """
+
+        self.packageUpdates.append(description)
+
+
+    def isConverged(self) -> bool:
+        """Returns if the install would make no changes besides updating packages.
+
+        :return: Whether the system is already converged.
+        """
+
+        return len(self.downloads) == 0 and len(self.sourceWrites) == 0 and len(self.steps) == 0 and len(self.transactions) == 0
+
+
+    def print(self) -> None:
+        """Prints the plan.
+        """
+
+        cache = getArtifactCache()
+        if len(self.downloads) > 0:
+            print("Downloads:")
+            for url in self.downloads:
+                print("  " + url + (" (cached)" if cache.isCachedReadOnly(url) else ""))
+        if len(self.sourceWrites) > 0:
+            print("Source changes:")
+            for description in self.sourceWrites:
+                print("  " + description)
+        if len(self.steps) > 0:
+            print("Steps:")
+            for description in self.steps:
+                print("  " + description)
+        if len(self.transactions) > 0:
+            print("Transactions:")
+            for packageManager in self.transactions.keys():
+                print("  " + packageManager + ": " + " ".join(self.transactions[packageManager]))
+        if len(self.packageUpdates) > 0:
+            print("Package updates:")
+            for description in self.packageUpdates:
+                print("  " + description)
+        if self.isConverged():
+            print("The system is converged. No changes would be made.")
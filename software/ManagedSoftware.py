@@ -5,19 +5,32 @@ Helper for managing installs that are distro-specific.
 """
 
 import os
-from typing import Callable
+import shutil
+from typing import Callable, Dict, List
 from helper.InstallContext import InstallContext
-from helper.Http import httpGet
+from helper.Cache import getCachedFile, prefetchFiles
+from helper.Journal import StateJournal
+from helper.PackageName import normalizePackageName
 from helper.Path import pathFileExists
-from helper.Ubuntu import getPpaRepositories, addPpaRepository, installDebFile
+from helper.Trace import traceSpan
+from helper.Ubuntu import getPpaRepositories, addPpaRepository, installDebFile, recordAptSourceChange
+from software.InstallPlan import InstallPlan
 from software.PackageManager import getPackageManager
 
 
+APT_KEYRING_DIRECTORY = "/usr/share/keyrings"
+APT_SOURCES_DIRECTORY = "/etc/apt/sources.list.d"
+
+
 class ManagedSoftware:
-    def __init__(self):
+    def __init__(self, name: str):
         """Creates the managed software helper.
+
+        :param name: Unique name of the software.
         """
 
+        self.name = name
+        self.dependencies = []
         self.packages = {}
         self.debFiles = []
         self.aptKeys = []
@@ -26,17 +39,19 @@ class ManagedSoftware:
         self.steps = []
 
 
-    def addAptKey(self, name: str, url: str) -> "ManagedSoftware":
+    def addAptKey(self, name: str, url: str, sha256: str = None) -> "ManagedSoftware":
         """Adds a key for Apt repositories.
 
         :param name: Name of the key.
         :param url: URL to download the key from.
+        :param sha256: Optional SHA-256 hash or URL of a sidecar file with the hash the key must have.
         :return: The managed software object to allow chaining.
         """
 
         self.aptKeys.append({
             "name": name,
             "url": url,
+            "sha256": sha256,
         })
         return self
 
@@ -56,17 +71,23 @@ class ManagedSoftware:
         return self
 
 
-    def addDebFile(self, package: str, url: str) -> "ManagedSoftware":
+    def addDebFile(self, package: str, url: str, addsSources: bool = False, sha256: str = None) -> "ManagedSoftware":
         """Adds a Debian file to download if a package isn't installed.
+        Deb files are installed with the queued apt packages unless they add apt sources,
+        in which case they are installed right away so the sources can be used.
 
         :param package: The package to check for before downloading the deb file.
         :param url: URL of the deb file to download.
+        :param addsSources: Whether the deb file adds apt sources.
+        :param sha256: Optional SHA-256 hash or URL of a sidecar file with the hash the deb file must have.
         :return: The managed software object to allow chaining.
         """
 
         self.debFiles.append({
             "package": package,
             "url": url,
+            "addsSources": addsSources,
+            "sha256": sha256,
         })
         return self
 
@@ -110,60 +131,331 @@ class ManagedSoftware:
         return self
 
 
-    def addStep(self, step: Callable[[InstallContext], None]) -> "ManagedSoftware":
+    def addDependency(self, software: "ManagedSoftware") -> "ManagedSoftware":
+        """Adds software that must be installed before this software.
+
+        :param software: Software to install first.
+        :return: The managed software object to allow chaining.
+        """
+
+        self.dependencies.append(software.name)
+        return self
+
+
+    def addStep(self, step: Callable[[InstallContext], None], urls: List[str] = None, resources: List[str] = None, required: Callable[[], bool] = None, resolveUrls: Callable[[], List[str]] = None) -> "ManagedSoftware":
         """Adds a step to run.
 
         :param step: Step to add.
+        :param urls: URLs the step downloads that can be prefetched.
+        :param resources: Resources the step uses (network, cpu, dpkg, pacman).
+        :param required: Function that returns if the step needs to run. Without it, the step always runs.
+        :param resolveUrls: Function that returns URLs the step downloads that are only known once the other URLs are downloaded, such as the archive of the latest release.
         :return: The managed software object to allow chaining.
         """
 
-        self.steps.append(step)
+        self.steps.append({
+            "function": step,
+            "urls": urls or [],
+            "resources": resources or [],
+            "required": required,
+            "resolveUrls": resolveUrls,
+        })
         return self
 
 
-    def install(self, context: InstallContext) -> None:
-        """Runs the install.
+    def getDefinition(self) -> dict:
+        """Returns the definition of the software for detecting changes to it.
 
-        :param context: Install context for managing the install.
+        :return: JSON-serializable definition of the software.
+        """
+
+        return {
+            "dependencies": self.dependencies,
+            "packages": self.packages,
+            "debFiles": self.debFiles,
+            "aptKeys": self.aptKeys,
+            "aptRepositories": self.aptRepositories,
+            "ppaRepositories": self.ppaRepositories,
+            "steps": [[step["function"].__name__, step["urls"]] for step in self.steps],
+        }
+
+
+    def getJournalInputs(self) -> dict:
+        """Returns the inputs of the install for recording it in the journal.
+
+        :return: JSON-serializable inputs of the install.
+        """
+
+        return {"definition": self.getDefinition()}
+
+
+    def isInstalled(self) -> bool:
+        """Returns if the software is installed, such as for detecting changes made outside of the install.
+        The PPA repositories, apt keys and repositories, deb files, packages, and the steps
+        that check if they are required are checked. Steps without a check are not.
+
+        :return: Whether the software is installed.
+        """
+
+        # Check the sources and deb files.
+        if pathFileExists("add-apt-repository"):
+            installedPpaRepositories = getPpaRepositories()
+            if any(ppaRepository not in installedPpaRepositories for ppaRepository in self.ppaRepositories):
+                return False
+        if pathFileExists("apt"):
+            if any(not os.path.exists(os.path.join(APT_KEYRING_DIRECTORY, key["name"])) for key in self.aptKeys):
+                return False
+            if any(not os.path.exists(os.path.join(APT_SOURCES_DIRECTORY, repository["name"])) for repository in self.aptRepositories):
+                return False
+        if pathFileExists("dpkg") and pathFileExists("apt"):
+            if any(not getPackageManager("apt").isPackageInstalled(debFileData["package"]) for debFileData in self.debFiles):
+                return False
+
+        # Check the steps and packages.
+        if any(step["required"] is not None and step["required"]() for step in self.steps):
+            return False
+        for packageManager in self.packages.keys():
+            if pathFileExists(packageManager):
+                packageManagerInstance = getPackageManager(packageManager)
+                if any(not packageManagerInstance.isPackageInstalled(normalizePackageName(package)) for package in self.packages[packageManager]):
+                    return False
+        return True
+
+
+    def getRequiredSteps(self) -> List[dict]:
+        """Returns the steps that need to run.
+
+        :return: The steps that need to run.
+        """
+
+        return [step for step in self.steps if step["required"] is None or step["required"]()]
+
+
+    def getDownloadUrls(self, includeInstalled: bool = False) -> List[str]:
+        """Returns the URLs that the install will download.
+
+        :param includeInstalled: Whether to include the URLs of files that are already installed, such as for a mirror.
+        :return: URLs to download before installing.
+        """
+
+        urls = []
+
+        # Add the apt keys, repositories, and deb files that are missing.
+        if pathFileExists("apt"):
+            for key in self.aptKeys:
+                if includeInstalled or not os.path.exists(os.path.join(APT_KEYRING_DIRECTORY, key["name"])):
+                    urls.append(key["url"])
+            for repository in self.aptRepositories:
+                if repository["repository"].startswith("http") and (includeInstalled or not os.path.exists(os.path.join(APT_SOURCES_DIRECTORY, repository["name"]))):
+                    urls.append(repository["repository"])
+            if pathFileExists("dpkg"):
+                for debFileData in self.debFiles:
+                    if includeInstalled or not getPackageManager("apt").isPackageInstalled(debFileData["package"]):
+                        urls.append(debFileData["url"])
+
+        # Add the URLs of the steps that need to run.
+        for step in (self.steps if includeInstalled else self.getRequiredSteps()):
+            urls.extend(step["urls"])
+        return urls
+
+
+    def getResolvedDownloadUrls(self, includeInstalled: bool = False) -> List[str]:
+        """Returns the URLs that the install will download that depend on the files of getDownloadUrls.
+        The files of getDownloadUrls must be downloaded first.
+
+        :param includeInstalled: Whether to include the URLs of files that are already installed, such as for a mirror.
+        :return: URLs to download before installing.
+        """
+
+        urls = []
+        for step in (self.steps if includeInstalled else self.getRequiredSteps()):
+            if step["resolveUrls"] is not None:
+                urls.extend(step["resolveUrls"]())
+        return urls
+
+
+    def getDownloadHashes(self) -> Dict[str, str]:
+        """Returns the expected hashes of the files the install downloads.
+
+        :return: SHA-256 hashes or URLs of sidecar files with the hashes, by the URLs of the files.
+        """
+
+        hashes = {}
+        for fileData in self.aptKeys + self.debFiles:
+            if fileData["sha256"] is not None:
+                hashes[fileData["url"]] = fileData["sha256"]
+        return hashes
+
+
+    def plan(self, plan: InstallPlan, context: InstallContext) -> None:
+        """Adds the changes the install would make to a plan without making them.
+
+        :param plan: Plan to add the changes to.
+        :param context: Install context for queueing the packages that would be installed.
         """
 
         # Add the PPA repositories.
         if pathFileExists("add-apt-repository"):
             for ppaRepository in self.ppaRepositories:
                 if ppaRepository not in getPpaRepositories():
-                    addPpaRepository(ppaRepository)
+                    plan.addSourceWrite("add-apt-repository " + ppaRepository)
 
-        # Add the apt keys.
+        # Add the apt keys and repositories.
         if pathFileExists("apt"):
             for key in self.aptKeys:
-                keyPath = "/usr/share/keyrings/" + key["name"]
+                keyPath = os.path.join(APT_KEYRING_DIRECTORY, key["name"])
                 if not os.path.exists(keyPath):
-                    with open(keyPath, "wb") as file:
-                        file.write(httpGet(key["url"]))
-
-        # Add the apt repositories.
-        if pathFileExists("apt"):
+                    plan.addDownload(key["url"])
+                    plan.addSourceWrite(keyPath)
             for repository in self.aptRepositories:
-                repositoryPath = "/etc/apt/sources.list.d/" + repository["name"]
+                repositoryPath = os.path.join(APT_SOURCES_DIRECTORY, repository["name"])
                 if not os.path.exists(repositoryPath):
-                    repositoryContents = repository["repository"]
-                    if repositoryContents.startswith("http"):
-                        repositoryContents = httpGet(repositoryContents).decode("utf8")
-                    with open(repositoryPath, "w") as file:
-                        file.write(repositoryContents)
+                    if repository["repository"].startswith("http"):
+                        plan.addDownload(repository["repository"])
+                    plan.addSourceWrite(repositoryPath)
 
-        # Install the deb files.
+        # Add the deb files.
         if pathFileExists("dpkg") and pathFileExists("apt"):
             for debFileData in self.debFiles:
                 if not getPackageManager("apt").isPackageInstalled(debFileData["package"]):
-                    installDebFile(debFileData["url"])
-
-        # Run the step.
-        for step in self.steps:
-            step(context)
+                    plan.addDownload(debFileData["url"])
+                    if debFileData["addsSources"]:
+                        plan.addTransaction("dpkg", [debFileData["package"] + ".deb"])
+                        plan.addSourceWrite("Sources of " + debFileData["package"] + ".deb")
+                    else:
+                        context.queueDebFile(debFileData["package"], debFileData["url"])
+
+        # Add the steps.
+        for step in self.getRequiredSteps():
+            plan.addStep(self.name + ": " + step["function"].__name__)
+            for url in step["urls"]:
+                plan.addDownload(url)
 
         # Queue the packages.
         for packageManager in self.packages.keys():
             if pathFileExists(packageManager):
-                for package in self.packages[packageManager]:
-                    context.queuePackage(packageManager, package)
\ No newline at end of file
+                context.queuePackages(packageManager, self.packages[packageManager])
+
+
+    def install(self, context: InstallContext) -> None:
+        """Runs the install.
+
+        :param context: Install context for managing the install.
+        """
+
+        # Add the PPA repositories.
+        if pathFileExists("add-apt-repository"):
+            with context.useResources(["network"]), traceSpan(self.name + " ppa", "install"):
+                for ppaRepository in self.ppaRepositories:
+                    if ppaRepository not in getPpaRepositories():
+                        addPpaRepository(ppaRepository)
+
+        # Add the apt keys.
+        if pathFileExists("apt"):
+            with context.useResources(["network"]), traceSpan(self.name + " keys", "install"):
+                for key in self.aptKeys:
+                    keyPath = os.path.join(APT_KEYRING_DIRECTORY, key["name"])
+                    if not os.path.exists(keyPath):
+                        shutil.copyfile(getCachedFile(key["url"], key["sha256"]), keyPath)
+                        recordAptSourceChange(keyPath)
+
+        # Add the apt repositories.
+        if pathFileExists("apt"):
+            with context.useResources(["network"]), traceSpan(self.name + " repos", "install"):
+                for repository in self.aptRepositories:
+                    repositoryPath = os.path.join(APT_SOURCES_DIRECTORY, repository["name"])
+                    if not os.path.exists(repositoryPath):
+                        repositoryContents = repository["repository"]
+                        if repositoryContents.startswith("http"):
+                            with open(getCachedFile(repositoryContents)) as repositoryFile:
+                                repositoryContents = repositoryFile.read()
+                        with open(repositoryPath, "w") as file:
+                            file.write(repositoryContents)
+                        recordAptSourceChange(repositoryPath)
+
+        # Install or queue the deb files.
+        if pathFileExists("dpkg") and pathFileExists("apt"):
+            with traceSpan(self.name + " debs", "install"):
+                for debFileData in self.debFiles:
+                    if not getPackageManager("apt").isPackageInstalled(debFileData["package"]):
+                        if debFileData["addsSources"]:
+                            with context.useResources(["network", "dpkg"]):
+                                installDebFile(debFileData["url"], debFileData["sha256"])
+                                recordAptSourceChange(debFileData["url"])
+                        else:
+                            with context.useResources(["network"]):
+                                context.queueDebFile(debFileData["package"], getCachedFile(debFileData["url"], debFileData["sha256"]))
+
+        # Run the steps.
+        for step in self.getRequiredSteps():
+            with context.useResources(step["resources"]), traceSpan(self.name + " step " + step["function"].__name__, "install"):
+                step["function"](context)
+
+        # Queue the packages.
+        with traceSpan(self.name + " queue", "install"):
+            for packageManager in self.packages.keys():
+                if pathFileExists(packageManager):
+                    context.queuePackages(packageManager, self.packages[packageManager])
+
+
+    def installAndRecord(self, context: InstallContext, journal: StateJournal) -> None:
+        """Runs the install and records it in the journal once it is complete.
+        If the install queued packages, it is recorded once the queued packages are installed.
+
+        :param context: Install context for managing the install.
+        :param journal: Journal to record the install in.
+        """
+
+        with context.recordQueuedPackages() as queuedNames:
+            self.install(context)
+        if len(queuedNames) == 0:
+            journal.completeStep(self.name, self.getJournalInputs())
+        else:
+            context.addInstalledCallback(lambda: journal.completeStep(self.name, self.getJournalInputs()))
+
+
+def prefetchSoftware(softwareList: List[ManagedSoftware], includeInstalled: bool = False) -> List[str]:
+    """Downloads the files that the install of software will download into the artifact cache.
+
+    :param softwareList: Software to download the files of.
+    :param includeInstalled: Whether to include the files that are already installed, such as for a mirror.
+    :return: URLs of the files that were downloaded.
+    """
+
+    # Download the files that are known before the install.
+    urls = []
+    hashes = {}
+    for software in softwareList:
+        urls.extend(software.getDownloadUrls(includeInstalled))
+        hashes.update(software.getDownloadHashes())
+    prefetchFiles(urls, hashes)
+
+    # Download the files that are known from the downloaded files.
+    resolvedUrls = []
+    for software in softwareList:
+        try:
+            resolvedUrls.extend(software.getResolvedDownloadUrls(includeInstalled))
+        except (OSError, ValueError, KeyError) as error:
+            print("Unable to determine the downloads of " + software.name + ": " + str(error))
+    prefetchFiles(resolvedUrls)
+    return list(dict.fromkeys(urls + resolvedUrls))
+
+
+def downloadSoftwarePackages(softwareList: List[ManagedSoftware]) -> Dict[str, List[str]]:
+    """Downloads the packages of software and all of their dependencies into the package caches of apt and pacman
+    without installing them. Packages that are installed are also downloaded so that other machines can use them.
+
+    :param softwareList: Software to download the packages of.
+    :return: Names of the package files in the package caches by package manager.
+    """
+
+    packageFiles = {}
+    for packageManager in ["apt", "pacman"]:
+        packages = []
+        for software in softwareList:
+            packages.extend(software.packages.get(packageManager, []))
+        packageFiles[packageManager] = []
+        if pathFileExists(packageManager) and len(packages) > 0:
+            with traceSpan("download " + packageManager, "install"):
+                packageFiles[packageManager] = getPackageManager(packageManager).downloadPackages(list(dict.fromkeys(packages)))
+    return packageFiles
@@ -6,11 +6,20 @@ Wrappers for package managers.
 
 import os
 import subprocess
-from typing import List
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import Dict, List
+from helper.Dpkg import readDpkgStatus
+from helper.Mirror import MIRROR_PACKAGE_DIRECTORIES
+from helper.PackageName import normalizePackageName
+from helper.Pacman import getPacmanDatabase
 from helper.Path import pathFileExists
 from helper.Process import runProcess
+from helper.Ubuntu import refreshAptIndexes
 
 staticPackageManagers = {}
+staticPackageManagersLock = threading.Lock()
 
 
 class PackageManager:
@@ -33,15 +42,26 @@ class PackageManager:
         raise NotImplementedError()
 
 
+    def downloadPackages(self, packages: List[str]) -> List[str]:
+        """Downloads a list of packages and all of their dependencies to the package cache without installing them.
+        Dependencies that are installed are also downloaded so that machines without them can use the files.
+
+        :param packages: Packages to download.
+        :return: Names of the package files of the packages and their dependencies in the package cache.
+        """
+
+        raise NotImplementedError()
+
+
 class AptPackageManager(PackageManager):
-    def __init__(self):
+    def __init__(self, rootPath: str = "/"):
         """Creates the apt package manager interface.
+
+        :param rootPath: Root of the file system to read the dpkg database from.
         """
 
         # Build the cache of the installed packages.
-        self.installedPackages = []
-        for line in subprocess.check_output(["apt", "list", "--installed"], stderr=subprocess.DEVNULL).decode().split("\n"):
-            self.installedPackages.append(line.split("/")[0].lower())
+        self.installedPackages = readDpkgStatus(rootPath)
 
 
     def isPackageInstalled(self, package: str) -> bool:
@@ -51,7 +71,7 @@ class AptPackageManager(PackageManager):
         :return: Whether it is installed or not.
         """
 
-        return package.lower() in self.installedPackages
+        return normalizePackageName(package) in self.installedPackages
 
 
     def installPackages(self, packages: List[str]) -> None:
@@ -63,16 +83,84 @@ class AptPackageManager(PackageManager):
         runProcess(["apt", "install", "-y"] + packages)
 
 
+    def resolvePackageClosure(self, packages: List[str]) -> List[str]:
+        """Returns the packages and all of the packages they depend on, including installed packages.
+        Virtual packages are replaced by the packages that provide them.
+
+        :param packages: Packages to resolve.
+        :return: Names of the packages and their dependencies.
+        """
+
+        # Top level lines of apt-cache depends are the packages. Virtual packages are in angle brackets.
+        output = subprocess.check_output(["apt-cache", "depends", "--recurse", "--no-recommends", "--no-suggests", "--no-conflicts", "--no-breaks", "--no-replaces", "--no-enhances"] + packages, stderr=subprocess.DEVNULL).decode()
+        closurePackages = []
+        for line in output.split("\n"):
+            if line == "" or line[0].isspace() or line.startswith("<"):
+                continue
+            closurePackages.append(line.strip())
+        return list(dict.fromkeys(closurePackages))
+
+
+    def downloadPackages(self, packages: List[str]) -> List[str]:
+        """Downloads a list of packages and all of their dependencies to the package cache without installing them.
+        Dependencies that are installed are also downloaded so that machines without them can use the files.
+
+        :param packages: Packages to download.
+        :return: Names of the package files of the packages and their dependencies in the package cache.
+        """
+
+        refreshAptIndexes()
+        closurePackages = self.resolvePackageClosure(packages)
+
+        # Determine the files of the packages. Lines are "'uri' fileName size hash".
+        packageFiles = []
+        missingPackages = []
+        packageDirectory = MIRROR_PACKAGE_DIRECTORIES["apt"]
+        for line in subprocess.check_output(["apt-get", "download", "--print-uris"] + closurePackages).decode().split("\n"):
+            fields = line.split()
+            if len(fields) < 2 or not fields[1].endswith(".deb"):
+                continue
+            packageFile = fields[1]
+            packageFiles.append(packageFile)
+            if not os.path.exists(os.path.join(packageDirectory, packageFile)):
+                packageName, _, packageArchitecture = packageFile[:-len(".deb")].split("_")
+                missingPackages.append(packageName if packageArchitecture == "all" else packageName + ":" + packageArchitecture)
+
+        # Download the files that are not cached.
+        if len(missingPackages) > 0:
+            runProcess(["apt-get", "download"] + missingPackages, packageDirectory)
+        return packageFiles
+
+
+    def installPackagesAndDebFiles(self, packages: List[str], debFiles: Dict[str, str]) -> None:
+        """Installs a list of packages and deb files in a single transaction.
+
+        :param packages: Packages to install.
+        :param debFiles: Paths of the deb files to install, keyed by the package they install.
+        """
+
+        # apt only treats arguments as local files if they end in .deb, so they are linked with the extension.
+        with tempfile.TemporaryDirectory() as debDirectory:
+            debPaths = []
+            for packageName in debFiles.keys():
+                debPath = os.path.join(debDirectory, packageName + ".deb")
+                os.symlink(os.path.abspath(debFiles[packageName]), debPath)
+                debPaths.append(debPath)
+            self.installPackages(packages + debPaths)
+
+
 class PacmanPackageManager(PackageManager):
-    def __init__(self, keyword="pacman"):
+    def __init__(self, keyword="pacman", rootPath: str = "/"):
         """Creates the pacman package manager interface.
+
+        :param keyword: Command of the package manager.
+        :param rootPath: Root of the file system to read the pacman database from.
         """
 
-        # Build the cache of the installed packages.
+        # Get the shared cache of the installed packages.
+        # yay uses the same local database as pacman.
         self.keyword = keyword
-        self.installedPackages = []
-        for line in subprocess.check_output([self.keyword, "-Q"], stderr=subprocess.DEVNULL).decode().split("\n"):
-            self.installedPackages.append(line.split(" ")[0].strip().lower())
+        self.installedPackages = getPacmanDatabase(rootPath)
 
 
     def isPackageInstalled(self, package: str) -> bool:
@@ -82,7 +170,7 @@ class PacmanPackageManager(PackageManager):
         :return: Whether it is installed or not.
         """
 
-        return package.lower() in self.installedPackages
+        return self.installedPackages.isPackageInstalled(package)
 
 
     def installPackages(self, packages: List[str]) -> None:
@@ -94,12 +182,49 @@ class PacmanPackageManager(PackageManager):
         runProcess([self.keyword, "--needed", "--noconfirm", "-S"] + packages)
 
 
+    def resolvePackageClosure(self, packages: List[str]) -> List[str]:
+        """Returns the packages and all of the packages they depend on, including installed packages.
+        The dependencies are resolved from the sync databases with pactree (from pacman-contrib).
+
+        :param packages: Packages to resolve.
+        :return: Names of the packages and their dependencies.
+        """
+
+        closurePackages = []
+        for package in packages:
+            closurePackages.extend(subprocess.check_output(["pactree", "--sync", "--unique", package], stderr=subprocess.DEVNULL).decode().split())
+        return list(dict.fromkeys(closurePackages))
+
+
+    def downloadPackages(self, packages: List[str]) -> List[str]:
+        """Downloads a list of packages and all of their dependencies to the package cache without installing them.
+        Dependencies that are installed are also downloaded so that machines without them can use the files.
+
+        :param packages: Packages to download.
+        :return: Names of the package files of the packages and their dependencies in the package cache.
+        """
+
+        # Download the resolved packages without resolving the dependencies again, which would skip installed dependencies.
+        if pathFileExists("pactree"):
+            closurePackages = self.resolvePackageClosure(packages)
+            dependencyFlags = ["-dd"]
+        else:
+            print("pactree (pacman-contrib) is not installed. Only the dependencies that are not installed will be downloaded.")
+            closurePackages = packages
+            dependencyFlags = []
+        packageFiles = subprocess.check_output(["pacman", "-Sp", "--print-format", "%f"] + dependencyFlags + closurePackages).decode().split()
+        runProcess([self.keyword, "--noconfirm", "-Sw"] + dependencyFlags + closurePackages)
+        return packageFiles
+
+
 class YayPackageManager(PacmanPackageManager):
-    def __init__(self):
+    def __init__(self, rootPath: str = "/"):
         """Creates the yay package manager interface.
+
+        :param rootPath: Root of the file system to read the pacman database from.
         """
 
-        super().__init__("yay")
+        super().__init__("yay", rootPath)
 
 
     def installPackages(self, packages: List[str]) -> None:
@@ -113,8 +238,25 @@ class YayPackageManager(PacmanPackageManager):
         runProcess(["su", os.environ["SUDO_USER"], "-c", "konsole -e \"yay -S --needed " + " ".join(packages) + "\""])
 
 
+def createPackageManager(packageManagerName: str) -> PackageManager:
+    """Creates the package manager for a given name.
+
+    :param packageManagerName: Name of the package manager.
+    :return: The package manager for the given name.
+    """
+
+    if packageManagerName == "apt":
+        return AptPackageManager()
+    elif packageManagerName == "pacman":
+        return PacmanPackageManager()
+    elif packageManagerName == "yay":
+        return YayPackageManager()
+    raise ValueError("Unknown package manager: " + packageManagerName)
+
+
 def getPackageManager(packageManagerName: str) -> PackageManager:
     """Returns the static package manager for a given name.
+    If the package manager is being created in the background, this waits for it.
 
     :param packageManagerName: Name of the package manager.
     :return: The package manager for the given name.
@@ -124,14 +266,54 @@ def getPackageManager(packageManagerName: str) -> PackageManager:
     packageManagerName = packageManagerName.lower()
     if packageManagerName == "aur":
         packageManagerName = "yay"
-    if packageManagerName not in staticPackageManagers.keys():
-        if packageManagerName == "apt":
-            staticPackageManagers["apt"] = AptPackageManager()
-        elif packageManagerName == "pacman":
-            staticPackageManagers["pacman"] = PacmanPackageManager()
-        elif packageManagerName == "yay":
-            staticPackageManagers["yay"] = YayPackageManager()
-    return staticPackageManagers[packageManagerName]
+
+    # Create the package manager if no other thread is creating it.
+    createPackageManagerInThread = False
+    with staticPackageManagersLock:
+        if packageManagerName not in staticPackageManagers.keys():
+            staticPackageManagers[packageManagerName] = Future()
+            createPackageManagerInThread = True
+    packageManagerFuture = staticPackageManagers[packageManagerName]
+    if createPackageManagerInThread:
+        try:
+            packageManagerFuture.set_result(createPackageManager(packageManagerName))
+        except Exception as error:
+            packageManagerFuture.set_exception(error)
+    return packageManagerFuture.result()
+
+
+def warmPackageManagers(packageManagerNames: List[str]) -> None:
+    """Starts creating package managers in background threads.
+
+    :param packageManagerNames: Names of the package managers to create.
+    """
+
+    def warmPackageManager(packageManagerName: str) -> None:
+        """Creates a package manager, leaving errors to be raised when it is used.
+
+        :param packageManagerName: Name of the package manager to create.
+        """
+
+        try:
+            getPackageManager(packageManagerName)
+        except Exception:
+            pass
+
+    for packageManagerName in packageManagerNames:
+        threading.Thread(target=warmPackageManager, args=(packageManagerName,), daemon=True).start()
+
+
+def warmSystemPackageManagers() -> None:
+    """Starts creating the package managers of the system in background threads.
+    """
+
+    systemPackageManager = getSystemPackageManager()
+    packageManagerNames = []
+    if systemPackageManager is not None:
+        packageManagerNames.append(systemPackageManager)
+    if systemPackageManager == "pacman":
+        packageManagerNames.append("yay")
+    warmPackageManagers(packageManagerNames)
 
 
 def getSystemPackageManager() -> str:
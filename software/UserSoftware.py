@@ -0,0 +1,25 @@
+"""
+TheNexusAvenger
+
+Software installed for the user profile.
+"""
+
+from typing import List
+from software.VSCodeExtensions import VSCodeExtensions
+
+
+JETBRAINS_TOOLBOX_URL = "https://download.jetbrains.com/toolbox/jetbrains-toolbox-1.25.12627.tar.gz"
+
+vscodeExtensions = VSCodeExtensions()\
+    .addExtension("evaera.vscode-rojo")\
+    .addExtension("Nightrains.robloxlsp")\
+    .addExtension("yzhang.markdown-all-in-one")
+
+
+def getUserDownloadUrls() -> List[str]:
+    """Returns the URLs that the user setup downloads.
+
+    :return: URLs of the files the user setup downloads.
+    """
+
+    return [JETBRAINS_TOOLBOX_URL] + vscodeExtensions.getVsixUrls()
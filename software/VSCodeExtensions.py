@@ -0,0 +1,140 @@
+"""
+TheNexusAvenger
+
+Helper for managing Visual Studio Code extensions.
+"""
+
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional
+from helper.Cache import getArtifactCache, getArtifactCacheDirectory, getCachedFile
+from helper.Path import pathFileExists
+from helper.Process import runProcess
+
+
+class VSCodeExtensions:
+    def __init__(self):
+        """Creates the Visual Studio Code extensions helper.
+        """
+
+        self.extensions = []
+
+
+    def addExtension(self, extensionId: str, vsixUrl: str = None) -> "VSCodeExtensions":
+        """Adds an extension to install.
+
+        :param extensionId: Id of the extension (ex: publisher.name).
+        :param vsixUrl: Optional URL of a VSIX file to install the extension from instead of the marketplace.
+        :return: The extensions object to allow chaining.
+        """
+
+        self.extensions.append({
+            "id": extensionId,
+            "vsixUrl": vsixUrl,
+        })
+        return self
+
+
+    @staticmethod
+    def getVsixDirectory() -> str:
+        """Returns the directory to look for offline VSIX files in.
+        Files in the directory are named by the extension id (ex: publisher.name.vsix).
+        The NEXUS_SETUP_VSIX_DIRECTORY environment variable can be used to change it.
+
+        :return: The directory of the offline VSIX files.
+        """
+
+        return os.getenv("NEXUS_SETUP_VSIX_DIRECTORY", os.path.join(getArtifactCacheDirectory(), "vsix"))
+
+
+    @staticmethod
+    def getMarketplaceVsixUrl(extensionId: str) -> str:
+        """Returns the URL to download the VSIX file of the latest version of an extension from the marketplace.
+
+        :param extensionId: Id of the extension (ex: publisher.name).
+        :return: The URL of the VSIX file.
+        """
+
+        publisher, name = extensionId.split(".", 1)
+        return "https://marketplace.visualstudio.com/_apis/public/gallery/publishers/" + publisher + "/vsextensions/" + name + "/latest/vspackage"
+
+
+    def getVsixUrls(self) -> List[str]:
+        """Returns the URLs of the VSIX files of the extensions, such as for installing without a network.
+
+        :return: The URLs of the VSIX files.
+        """
+
+        return [extension["vsixUrl"] or self.getMarketplaceVsixUrl(extension["id"]) for extension in self.extensions]
+
+
+    def getMissingExtensions(self) -> List[dict]:
+        """Returns the extensions that are not installed.
+        The installed extensions are listed with a single call.
+
+        :return: The extensions that are not installed.
+        """
+
+        installedExtensions = set()
+        for line in subprocess.check_output(["code", "--list-extensions"]).decode().split("\n"):
+            installedExtensions.add(line.strip().lower())
+        return [extension for extension in self.extensions if extension["id"].lower() not in installedExtensions]
+
+
+    def getVsixPath(self, extension: dict) -> Optional[str]:
+        """Returns the path of a VSIX file to install an extension from, if there is one.
+
+        :param extension: Extension to get the file for.
+        :return: The path to the VSIX file, if there is one.
+        """
+
+        localVsixPath = os.path.join(self.getVsixDirectory(), extension["id"] + ".vsix")
+        if os.path.exists(localVsixPath):
+            return localVsixPath
+        if extension["vsixUrl"] is not None:
+            return getCachedFile(extension["vsixUrl"])
+
+        # Use the VSIX file from the marketplace if it was downloaded, such as from a bundle.
+        # The marketplace can send the file compressed with gzip, which code can't install.
+        marketplaceUrl = self.getMarketplaceVsixUrl(extension["id"])
+        if not getArtifactCache().isCached(marketplaceUrl):
+            return None
+        marketplaceVsixPath = getCachedFile(marketplaceUrl)
+        with open(marketplaceVsixPath, "rb") as file:
+            if file.read(2) != b"\x1f\x8b":
+                return marketplaceVsixPath
+        os.makedirs(self.getVsixDirectory(), exist_ok=True)
+        with gzip.open(marketplaceVsixPath, "rb") as compressedFile, open(localVsixPath, "wb") as file:
+            shutil.copyfileobj(compressedFile, file)
+        return localVsixPath
+
+
+    def install(self) -> None:
+        """Installs the missing extensions with a single call.
+        """
+
+        if not pathFileExists("code"):
+            return
+        missingExtensions = self.getMissingExtensions()
+        if len(missingExtensions) == 0:
+            return
+
+        # Build the install parameters.
+        # code only treats files ending in .vsix as files, so VSIX files are linked with the extension.
+        with tempfile.TemporaryDirectory() as vsixDirectory:
+            parameters = ["code"]
+            for extension in missingExtensions:
+                vsixPath = self.getVsixPath(extension)
+                if vsixPath is None:
+                    parameters.extend(["--install-extension", extension["id"]])
+                else:
+                    linkedVsixPath = os.path.join(vsixDirectory, extension["id"] + ".vsix")
+                    os.symlink(os.path.abspath(vsixPath), linkedVsixPath)
+                    parameters.extend(["--install-extension", linkedVsixPath])
+
+            # Install the extensions.
+            print("Installing " + str(len(missingExtensions)) + " Visual Studio Code extensions.")
+            runProcess(parameters)
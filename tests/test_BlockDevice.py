@@ -0,0 +1,113 @@
+"""
+TheNexusAvenger
+
+Tests for reading the block devices and where they are mounted.
+"""
+
+import os
+import unittest
+from unittest import mock
+from helper.BlockDevice import BlockDeviceTree
+
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BLOCK_DEVICE_ROOT = os.path.join(FIXTURES_DIRECTORY, "BlockDevice")
+LSBLK_OUTPUT_PATH = os.path.join(FIXTURES_DIRECTORY, "BlockDevice-lsblk.json")
+
+
+class BlockDeviceTreeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Reads the fixture tree.
+        """
+
+        self.tree = BlockDeviceTree(BLOCK_DEVICE_ROOT)
+
+
+    def testDisks(self) -> None:
+        """Tests that disks are read from sysfs without a parent.
+        """
+
+        for name, majorMinor in [("sda", "8:0"), ("nvme0n1", "259:0"), ("mmcblk0", "179:0")]:
+            device = self.tree.getDevice(name)
+            self.assertEqual(device.deviceType, "disk")
+            self.assertEqual(device.majorMinor, majorMinor)
+            self.assertIsNone(device.partitionNumber)
+            self.assertIsNone(self.tree.getParentDisk(device))
+            self.assertEqual(device.getDevicePath(), "/dev/" + name)
+
+
+    def testPartitions(self) -> None:
+        """Tests that partitions are read with their number and disk.
+        The disks of NVMe and MMC partitions can't be found by removing the number from the name.
+        """
+
+        for name, parentName, partitionNumber in [("sda1", "sda", 1), ("sda2", "sda", 2), ("nvme0n1p1", "nvme0n1", 1), ("nvme0n1p2", "nvme0n1", 2), ("mmcblk0p1", "mmcblk0", 1)]:
+            device = self.tree.getDevice(name)
+            self.assertEqual(device.deviceType, "part")
+            self.assertEqual(device.partitionNumber, partitionNumber)
+            self.assertEqual(self.tree.getParentDisk(device).name, parentName)
+            self.assertIn(name, self.tree.getDevice(parentName).children)
+
+
+    def testMountPoints(self) -> None:
+        """Tests that mounts are matched by the major and minor numbers.
+        """
+
+        self.assertEqual(self.tree.getMountedDevice("/boot/efi").name, "nvme0n1p1")
+        self.assertEqual(self.tree.getMountedDevice("/media/sd").name, "mmcblk0p1")
+        self.assertEqual(self.tree.getMountedDevice("/mnt/data disk").name, "sda1")
+        self.assertEqual(self.tree.getDevice("sda2").mountPoints, [])
+        self.assertIsNone(self.tree.getMountedDevice("/proc"))
+
+
+    def testBtrfsMountPoints(self) -> None:
+        """Tests that btrfs mounts, which have virtual major and minor numbers, are matched by their source.
+        """
+
+        self.assertEqual(self.tree.getMountedDevice("/").name, "nvme0n1p2")
+        self.assertEqual(self.tree.getMountedDevice("/home").name, "nvme0n1p2")
+        self.assertEqual(self.tree.getDevice("nvme0n1p2").mountPoints, ["/", "/home"])
+
+
+class BlockDeviceTreeLsblkTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Reads the lsblk fixture.
+        """
+
+        with open(LSBLK_OUTPUT_PATH) as file:
+            self.lsblkOutput = file.read()
+
+
+    def testReadLsblk(self) -> None:
+        """Tests reading the devices and mount points from the output of lsblk.
+        """
+
+        tree = BlockDeviceTree(os.path.join(FIXTURES_DIRECTORY, "Empty"))
+        self.assertEqual(tree.devices, {})
+        tree.readLsblk(self.lsblkOutput)
+        for name, parentName, partitionNumber in [("sda1", "sda", 1), ("nvme0n1p2", "nvme0n1", 2), ("mmcblk0p1", "mmcblk0", 1)]:
+            device = tree.getDevice(name)
+            self.assertEqual(device.deviceType, "part")
+            self.assertEqual(device.partitionNumber, partitionNumber)
+            self.assertEqual(tree.getParentDisk(device).name, parentName)
+        self.assertEqual(tree.getDevice("nvme0n1").deviceType, "disk")
+        self.assertIsNone(tree.getDevice("nvme0n1").partitionNumber)
+        self.assertEqual(tree.getMountedDevice("/boot/efi").name, "nvme0n1p1")
+        self.assertEqual(tree.getMountedDevice("/mnt/data disk").name, "sda1")
+
+
+    def testLsblkFallback(self) -> None:
+        """Tests that lsblk is used when /sys/class/block is not available.
+        """
+
+        isdir = os.path.isdir
+        with mock.patch("helper.BlockDevice.os.path.isdir", side_effect=lambda path: False if path.endswith("sys/class/block") else isdir(path)), \
+                mock.patch("helper.BlockDevice.subprocess.check_output", return_value=self.lsblkOutput.encode()) as checkOutput:
+            tree = BlockDeviceTree()
+        self.assertEqual(checkOutput.call_args[0][0][0], "lsblk")
+        self.assertEqual(sorted(tree.getDevice("nvme0n1").children), ["nvme0n1p1", "nvme0n1p2"])
+        self.assertEqual(tree.getParentDisk(tree.getDevice("mmcblk0p1")).name, "mmcblk0")
+
+
+if __name__ == "__main__":
+    unittest.main()
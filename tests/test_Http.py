@@ -0,0 +1,194 @@
+"""
+TheNexusAvenger
+
+Tests for resuming downloads.
+"""
+
+import hashlib
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+import helper.Cache
+import helper.Mirror
+from helper.Http import getDownloadValidatorPath, httpDownload
+
+
+def getEtag(contents: bytes) -> str:
+    """Returns the ETag the server sends for contents.
+
+    :param contents: Contents of the file.
+    :return: The ETag of the contents.
+    """
+
+    return "\"" + hashlib.sha256(contents).hexdigest()[0:16] + "\""
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    contents = b""
+    requests = []
+
+
+    def do_GET(self) -> None:
+        """Handles a GET request, supporting Range and If-Range headers.
+        """
+
+        etag = getEtag(self.contents)
+        rangeHeader = self.headers.get("Range")
+        ifRange = self.headers.get("If-Range")
+        RangeRequestHandler.requests.append((rangeHeader, ifRange))
+        if rangeHeader is not None and (ifRange is None or ifRange == etag):
+            start = int(rangeHeader[len("bytes="):-1])
+            if start >= len(self.contents):
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */" + str(len(self.contents)))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes " + str(start) + "-" + str(len(self.contents) - 1) + "/" + str(len(self.contents)))
+            body = self.contents[start:]
+        else:
+            self.send_response(200)
+            body = self.contents
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, *args) -> None:
+        """Hides the request logs.
+        """
+
+        pass
+
+
+class HttpDownloadTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Starts the HTTP server.
+        """
+
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = "http://127.0.0.1:" + str(cls.server.server_address[1]) + "/file.bin"
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Stops the HTTP server.
+        """
+
+        cls.server.shutdown()
+        cls.server.server_close()
+
+
+    def setUp(self) -> None:
+        """Creates the directory to download to.
+        """
+
+        self.temporaryDirectory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temporaryDirectory.name, "partial")
+        self.oldContents = os.urandom(100000)
+        self.newContents = os.urandom(100000)
+        RangeRequestHandler.contents = self.oldContents
+        RangeRequestHandler.requests = []
+
+
+    def tearDown(self) -> None:
+        """Removes the directory to download to.
+        """
+
+        self.temporaryDirectory.cleanup()
+
+
+    def writePartial(self, contents: bytes, validator: str = None) -> None:
+        """Writes a partial download.
+
+        :param contents: Contents of the partial file.
+        :param validator: Optional validator of the partial file.
+        """
+
+        with open(self.path, "wb") as file:
+            file.write(contents)
+        if validator is not None:
+            with open(getDownloadValidatorPath(self.path), "w") as file:
+                file.write(validator)
+
+
+    def assertDownloaded(self, contents: bytes, sha256: str) -> None:
+        """Asserts that the file was downloaded with the given contents.
+
+        :param contents: Expected contents of the file.
+        :param sha256: SHA-256 hash returned by the download.
+        """
+
+        with open(self.path, "rb") as file:
+            self.assertEqual(file.read(), contents)
+        self.assertEqual(sha256, hashlib.sha256(contents).hexdigest())
+        self.assertFalse(os.path.exists(getDownloadValidatorPath(self.path)))
+
+
+    def testResumeUnchangedFile(self) -> None:
+        """Tests that partial files are resumed if the file has not changed.
+        """
+
+        self.writePartial(self.oldContents[0:40000], getEtag(self.oldContents))
+        _, sha256 = httpDownload(self.url, self.path)
+        self.assertDownloaded(self.oldContents, sha256)
+        self.assertEqual(RangeRequestHandler.requests, [("bytes=40000-", getEtag(self.oldContents))])
+
+
+    def testResumeChangedFile(self) -> None:
+        """Tests that partial files are downloaded again if the file changed.
+        """
+
+        self.writePartial(self.oldContents[0:40000], getEtag(self.oldContents))
+        RangeRequestHandler.contents = self.newContents
+        _, sha256 = httpDownload(self.url, self.path)
+        self.assertDownloaded(self.newContents, sha256)
+
+
+    def testResumeWithoutValidator(self) -> None:
+        """Tests that partial files without a validator are not resumed.
+        """
+
+        self.writePartial(self.oldContents[0:40000])
+        RangeRequestHandler.contents = self.newContents
+        _, sha256 = httpDownload(self.url, self.path)
+        self.assertDownloaded(self.newContents, sha256)
+        self.assertEqual(RangeRequestHandler.requests, [(None, None)])
+
+
+    def testResumePastEnd(self) -> None:
+        """Tests that partial files larger than the file are downloaded again.
+        """
+
+        RangeRequestHandler.contents = self.newContents[0:30000]
+        self.writePartial(self.oldContents[0:40000], getEtag(RangeRequestHandler.contents))
+        _, sha256 = httpDownload(self.url, self.path)
+        self.assertDownloaded(self.newContents[0:30000], sha256)
+
+
+    def testCacheChangedFile(self) -> None:
+        """Tests that the artifact cache does not store a stale partial file joined to a changed file.
+        """
+
+        helper.Mirror.staticMirrorUrl = None
+        helper.Mirror.staticMirrorUrlLoaded = True
+        artifactCache = helper.Cache.ArtifactCache(os.path.join(self.temporaryDirectory.name, "cache"))
+        os.makedirs(artifactCache.partialDirectory)
+        self.path = os.path.join(artifactCache.partialDirectory, hashlib.sha256(self.url.encode("utf8")).hexdigest())
+        self.writePartial(self.oldContents[0:40000], getEtag(self.oldContents))
+        RangeRequestHandler.contents = self.newContents
+        with open(artifactCache.getFile(self.url), "rb") as file:
+            self.assertEqual(file.read(), self.newContents)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(getDownloadValidatorPath(self.path)))
+
+
+if __name__ == "__main__":
+    unittest.main()